@@ -0,0 +1,335 @@
+"""Output backends: where the keystrokes of a plan are sent.
+
+pyautogui (and its pyscreeze/pymsgbox/mouseinfo dependencies, plus the display
+connection) is only imported when the pyautogui backend is first created.
+"""
+import sys
+import time
+
+# Loaded on first use by _load_pyautogui()
+pyautogui = None
+
+
+def _load_pyautogui():
+    """Import and configure pyautogui the first time a backend needs it."""
+    global pyautogui
+    if pyautogui is None:
+        import pyautogui as module  # <-- The external application typing library
+        # Configure PyAutoGUI settings
+        module.PAUSE = 0 # No pause between PyAutoGUI calls by default (we manage the delay ourselves)
+        module.FAILSAFE = True # Move the mouse to the top-left corner to stop the program
+        pyautogui = module
+    return pyautogui
+
+
+def is_failsafe_abort(exc: BaseException) -> bool:
+    """Return True if `exc` is pyautogui's corner failsafe (the user aborting the run)."""
+    return pyautogui is not None and isinstance(exc, pyautogui.FailSafeException)
+
+
+def py_typewrite(text, interval=0):
+    """Compatibility wrapper that uses pyautogui.write if available, otherwise falls back to pyautogui.typewrite.
+
+    Raises a RuntimeError with module file info if neither is available to help diagnose shadowing.
+    """
+    pyautogui = _load_pyautogui()
+    if hasattr(pyautogui, 'write'):
+        return pyautogui.write(text, interval=interval)
+    if hasattr(pyautogui, 'typewrite'):
+        return pyautogui.typewrite(text, interval=interval)
+
+    # Diagnostic output to help figure out why the functions are missing.
+    try:
+        module_file = getattr(pyautogui, '__file__', None)
+        print("[diagnostic] pyautogui repr:", repr(pyautogui))
+        print("[diagnostic] pyautogui type:", type(pyautogui))
+        print("[diagnostic] pyautogui __file__:", module_file)
+        print("[diagnostic] pyautogui dir() (first 50):", dir(pyautogui)[:50])
+    except Exception as e:
+        print("[diagnostic] error while introspecting pyautogui:", e)
+
+    raise RuntimeError(
+        "pyautogui has no 'write' or 'typewrite'. This usually means PyAutoGUI is not installed or a local file is shadowing it. "
+        f"Module __file__: {module_file!r}.\nCheck your PYTHONPATH and ensure there's no local file named 'pyautogui.py' or a folder named 'pyautogui'."
+    )
+
+# Key combination that pastes the clipboard into the focused window
+PASTE_HOTKEY = ('command', 'v') if sys.platform == 'darwin' else ('ctrl', 'v')
+# Time the target gets to read the clipboard before it is restored on close()
+CLIPBOARD_SETTLE_SECONDS = 0.1
+
+
+def _load_pyperclip():
+    try:
+        import pyperclip
+    except ImportError as e:
+        raise RuntimeError("Typing characters that have no key needs pyperclip (pip install pyperclip).") from e
+    return pyperclip
+
+
+class OutputBackend:
+    """Where keystrokes go. Subclasses implement write() and press().
+
+    `write(text)` types a string and `press(key)` presses a named key such as
+    'backspace'. Backends are created on the thread that uses them.
+
+    Characters for which can_type() is False (curly quotes, dashes, accented or
+    non-Latin letters missing from the keymap) are sent with paste() instead, which
+    puts them on the clipboard and presses PASTE_HOTKEY; the user's clipboard is
+    restored by close().
+    """
+    name = 'base'
+    _saved_clipboard = None
+
+    def can_type(self, char: str) -> bool:
+        """Whether write() can produce `char` with a key press."""
+        return True
+
+    def paste(self, text: str):
+        """Insert `text` through the clipboard in one go."""
+        pyperclip = _load_pyperclip()
+        if self._saved_clipboard is None:
+            try:
+                self._saved_clipboard = pyperclip.paste()
+            except Exception:
+                self._saved_clipboard = ''
+        pyperclip.copy(text)
+        self.press_paste()
+
+    def press_paste(self):
+        raise NotImplementedError
+
+    def _restore_clipboard(self):
+        if self._saved_clipboard is None:
+            return
+        time.sleep(CLIPBOARD_SETTLE_SECONDS)
+        try:
+            _load_pyperclip().copy(self._saved_clipboard)
+        except Exception:
+            pass
+        self._saved_clipboard = None
+
+    def write(self, text: str):
+        raise NotImplementedError
+
+    def press(self, key: str):
+        raise NotImplementedError
+
+    def write_burst(self, text: str, intervals):
+        """Type `text` with intervals[k] seconds between characters k and k+1 (burst mode).
+
+        The spacing is kept here instead of in the engine, so a run of fast keys costs
+        one call. Returns once the last character is out. Backends that can emit a
+        key more cheaply than write() override this.
+        """
+        clock, sleep = time.perf_counter, time.sleep
+        deadline = clock()
+        write = self.write
+        for char, gap in zip(text, intervals):
+            write(char)
+            deadline += gap
+            remaining = deadline - clock()
+            if remaining > 0:
+                sleep(remaining)
+        write(text[-1])
+
+    def close(self):
+        self._restore_clipboard()
+
+
+class PyAutoGUIBackend(OutputBackend):
+    """Sends keys through pyautogui (portable, honours the corner failsafe)."""
+    name = 'pyautogui'
+
+    def __init__(self):
+        _load_pyautogui()
+        self._typeable = {}
+
+    def can_type(self, char: str) -> bool:
+        # pyautogui.write skips characters it has no key for
+        known = self._typeable.get(char)
+        if known is None:
+            known = self._typeable[char] = bool(pyautogui.isValidKey(char))
+        return known
+
+    def press_paste(self):
+        pyautogui.hotkey(*PASTE_HOTKEY)
+
+    def write(self, text: str):
+        py_typewrite(text, interval=0)
+
+    def press(self, key: str):
+        pyautogui.press(key)
+
+    def write_burst(self, text: str, intervals):
+        # pyautogui spaces the keys itself, with one interval for the whole run
+        interval = sum(intervals) / len(intervals) if len(intervals) else 0
+        py_typewrite(text, interval=interval)
+
+
+# Characters and key names that need an explicit X keysym name
+_X11_KEYSYM_NAMES = {
+    '\n': 'Return', '\t': 'Tab', ' ': 'space',
+    'backspace': 'BackSpace', 'enter': 'Return', 'return': 'Return', 'tab': 'Tab',
+    'space': 'space', 'delete': 'Delete', 'esc': 'Escape', 'escape': 'Escape',
+}
+
+
+class XTestBackend(OutputBackend):
+    """Sends keys straight to the X server with the XTEST extension (Linux).
+
+    Skips pyautogui's per-call overhead and failsafe check; keycodes are looked up
+    once per character and each write() is flushed with a single sync, so a
+    multi-character write goes out as one batch. Needs python-xlib, which pyautogui
+    already depends on under X11.
+    """
+    name = 'xtest'
+
+    def __init__(self, display_name=None):
+        try:
+            from Xlib import X, XK, display
+            from Xlib.ext import xtest
+        except ImportError as e:
+            raise RuntimeError("The 'xtest' output backend needs python-xlib (pip install python-xlib).") from e
+        self._press_event = X.KeyPress
+        self._release_event = X.KeyRelease
+        self._fake_input = xtest.fake_input
+        self._string_to_keysym = XK.string_to_keysym
+        self.display = display.Display(display_name)
+        self._shift = self.display.keysym_to_keycode(XK.string_to_keysym('Shift_L'))
+        self._keycodes = {}
+
+    def _lookup(self, key: str):
+        """Return (keycode, needs_shift) for a character or key name; keycode 0 if unmapped."""
+        cached = self._keycodes.get(key)
+        if cached is None:
+            name = _X11_KEYSYM_NAMES.get(key)
+            if name is not None:
+                keysym = self._string_to_keysym(name)
+            elif len(key) == 1:
+                # Latin-1 keysyms equal the code point; everything else uses the Unicode range
+                keysym = ord(key) if ord(key) < 0x100 else 0x01000000 + ord(key)
+            else:
+                keysym = self._string_to_keysym(key)
+            keycode = self.display.keysym_to_keycode(keysym)
+            shift = bool(keycode) and self.display.keycode_to_keysym(keycode, 0) != keysym
+            cached = self._keycodes[key] = (keycode, shift)
+        return cached
+
+    def _tap(self, keycode: int, shift: bool):
+        fake_input, display = self._fake_input, self.display
+        if shift:
+            fake_input(display, self._press_event, self._shift)
+        fake_input(display, self._press_event, keycode)
+        fake_input(display, self._release_event, keycode)
+        if shift:
+            fake_input(display, self._release_event, self._shift)
+
+    def write(self, text: str):
+        for char in text:
+            keycode, shift = self._lookup(char)
+            # like pyautogui, characters without a key on this keymap are skipped
+            if keycode:
+                self._tap(keycode, shift)
+        self.display.sync()
+
+    def press(self, key: str):
+        keycode, shift = self._lookup(key)
+        if keycode:
+            self._tap(keycode, shift)
+            self.display.sync()
+
+    def write_burst(self, text: str, intervals):
+        clock, sleep, sync = time.perf_counter, time.sleep, self.display.sync
+        deadline = clock()
+        for char, gap in zip(text, list(intervals) + [0.0]):
+            keycode, shift = self._lookup(char)
+            if keycode:
+                self._tap(keycode, shift)
+                sync()
+            deadline += gap
+            remaining = deadline - clock()
+            if remaining > 0:
+                sleep(remaining)
+
+    def can_type(self, char: str) -> bool:
+        return bool(self._lookup(char)[0])
+
+    def press_paste(self):
+        control, _ = self._lookup('Control_L')
+        keycode, _ = self._lookup('v')
+        fake_input, display = self._fake_input, self.display
+        fake_input(display, self._press_event, control)
+        fake_input(display, self._press_event, keycode)
+        fake_input(display, self._release_event, keycode)
+        fake_input(display, self._release_event, control)
+        display.sync()
+
+    def close(self):
+        self._restore_clipboard()
+        self.display.close()
+
+
+class NullBackend(OutputBackend):
+    """Discards every keystroke; for timing the engine without any output cost."""
+    name = 'null'
+
+    def write(self, text: str):
+        pass
+
+    def press(self, key: str):
+        pass
+
+    def write_burst(self, text: str, intervals):
+        pass
+
+    def paste(self, text: str):
+        pass
+
+
+class RecordingBackend(OutputBackend):
+    """Keeps every keystroke in memory as (perf_counter time, kind, value) tuples.
+
+    Lets the whole engine run headless, e.g. in CI or benchmarks. Characters in
+    `untypeable` are reported as having no key, to exercise the paste path.
+    """
+    name = 'record'
+
+    def __init__(self, clock=time.perf_counter, untypeable=''):
+        self.clock = clock
+        self.events = []
+        self.untypeable = frozenset(untypeable)
+
+    def can_type(self, char: str) -> bool:
+        return char not in self.untypeable
+
+    def paste(self, text: str):
+        self.events.append((self.clock(), 'paste', text))
+
+    def write(self, text: str):
+        self.events.append((self.clock(), 'write', text))
+
+    def press(self, key: str):
+        self.events.append((self.clock(), 'press', key))
+
+    def typed_text(self) -> str:
+        """Text the target would contain after replaying the events (backspace erases)."""
+        out = []
+        for _, kind, value in self.events:
+            if kind in ('write', 'paste'):
+                out.extend(value)
+            elif value == 'backspace' and out:
+                out.pop()
+        return ''.join(out)
+
+
+OUTPUT_BACKENDS = {cls.name: cls for cls in (PyAutoGUIBackend, XTestBackend, NullBackend, RecordingBackend)}
+
+
+def get_backend(name: str = 'pyautogui') -> OutputBackend:
+    """Create the output backend registered under `name` (see OUTPUT_BACKENDS)."""
+    try:
+        cls = OUTPUT_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown output backend {name!r}; choose one of {', '.join(OUTPUT_BACKENDS)}.") from None
+    return cls()
@@ -0,0 +1,241 @@
+"""Keystroke engine benchmarks.
+
+Runs compile_plan/execute_plan against in-memory output backends (no display or
+keyboard needed) and prints a JSON report, so results can be diffed between versions:
+
+    python bench.py                       # all sizes, all presets
+    python bench.py --sizes small,medium --presets normal --output bench_output.json
+
+For each corpus size and preset it reports:
+  - compile: time to build the keystroke plan
+  - throughput: keys/second and per-entry overhead with every delay set to zero,
+    per key and in burst mode
+  - jitter: lateness of each entry against its deadline (intended vs actual time),
+    as percentiles in milliseconds, plus CPU use while waiting. Delays are scaled by
+    --time-scale and the run is cut off after --jitter-seconds so presets stay quick.
+  - live_settings: the same lateness for type_text while new settings are published
+    --live-changes times mid-run (as dragging a slider in the GUI does), each one
+    rebuilding the ETA table like main.py. A run whose worst entry is later than
+    --max-late-ms is flagged, and the exit status is 1.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import threading
+import time
+from array import array
+
+import core
+from backends import get_backend
+from instrument import percentiles
+
+
+# Sample paragraphs mixing the structures the analyzer cares about
+_SAMPLE_PARAGRAPHS = [
+    "The quick brown fox jumps over the lazy dog. Mr. Smith watched from the porch, "
+    "unimpressed. However, the dog did not seem to mind (it rarely did).",
+    '"Are you coming?" she asked. "We leave at noon, i.e. in ten minutes." '
+    "He said nothing and kept reading.",
+    "Shopping list:\n- eggs\n- flour\n- 2 cups of sugar\n1. preheat the oven\n2. mix everything",
+    "— I told you already.\nAnna: You did not.\nBob: I did, e.g. yesterday at lunch.",
+    "In conclusion, the results were mixed. Overall, the second approach was faster, "
+    "but the first one was easier to maintain and to explain to new contributors, which "
+    "mattered more to the team than a few milliseconds here and there on a slow machine.",
+    "Therefore we kept it! Was that the right call? Time will tell, as it always does.",
+]
+
+SIZES = {
+    'small': 1_000,
+    'medium': 64_000,
+    'book': 1_000_000,
+}
+
+
+def make_corpus(size: int, seed: int = 0) -> str:
+    """Return roughly `size` characters of generated text made of sample paragraphs."""
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    while total < size:
+        para = rng.choice(_SAMPLE_PARAGRAPHS)
+        parts.append(para)
+        total += len(para) + 2
+    return '\n\n'.join(parts)[:size]
+
+
+class _TracingScheduler(core.DeadlineScheduler):
+    """DeadlineScheduler that records how late each wait() returned, in seconds."""
+
+    def start(self):
+        super().start()
+        self.lateness = array('d')
+
+    def wait(self):
+        super().wait()
+        self.lateness.append(self.clock() - self.deadline)
+
+
+def _zero_delay_plan(plan: core.KeystrokePlan) -> core.KeystrokePlan:
+    fast = core.KeystrokePlan()
+    fast.actions = plan.actions
+    fast.keys = plan.keys
+    fast.delays = array('d', bytes(8 * len(plan)))
+    return fast
+
+
+def _window(plan: core.KeystrokePlan, scale: float, budget: float) -> core.KeystrokePlan:
+    """First entries of `plan` with delays scaled by `scale`, up to `budget` seconds."""
+    out = core.KeystrokePlan()
+    total = 0.0
+    for action, key, delay in zip(plan.actions, plan.keys, plan.delays):
+        delay *= scale
+        if total + delay > budget and len(out):
+            break
+        out.actions.append(action)
+        out.keys.append(key)
+        out.delays.append(delay)
+        total += delay
+    return out
+
+
+def live_settings_case(text: str, settings: dict, time_scale: float, seconds: float, changes: int, seed: int) -> dict:
+    """Lateness of type_text over `seconds` while settings change `changes` times, evenly spread."""
+    def scaled(wpm):
+        out = dict(settings, typing_speed_wpm=wpm / time_scale)
+        for key in ('mid_sentence_pause_seconds', 'sentence_pause_seconds', 'paragraph_pause_seconds'):
+            out[key] = settings[key] * time_scale
+        return out
+
+    wpm = float(settings['typing_speed_wpm'])
+    live = core.LiveSettings(scaled(wpm))
+    control = core.RunControl()
+    scheduler = _TracingScheduler(control=control)
+    eta = core.LatestBuilder()
+    published = []
+    start = time.perf_counter()
+
+    def on_char(typed):
+        # one more change every seconds / (changes + 1), alternating the speed
+        due = int((time.perf_counter() - start) * (changes + 1) / seconds)
+        if len(published) < min(due, changes):
+            published.append(typed)
+            live.publish(scaled(wpm * (1.1 if len(published) % 2 else 1.0)))
+
+    def on_settings(snapshot, multipliers):
+        eta.request(lambda: core.EtaTable(text, snapshot, multipliers))
+
+    timer = threading.Timer(seconds, control.cancel)
+    timer.start()
+    try:
+        core.type_text(text, live, get_backend('null'), rng=core.PlanRandom(seed), on_char=on_char,
+                       scheduler=scheduler, on_settings=on_settings)
+    except core.TypingCancelled:
+        pass
+    finally:
+        timer.cancel()
+    lateness_ms = [x * 1e3 for x in scheduler.lateness]
+    return {
+        'time_scale': time_scale,
+        'entries': len(lateness_ms),
+        'changes': len(published),
+        'lateness_ms': percentiles(lateness_ms),
+    }
+
+
+def bench_case(text: str, settings: dict, time_scale: float, jitter_seconds: float, seed: int) -> dict:
+    result = {'chars': len(text)}
+
+    # analyze the text again for every case, or later presets would only measure cache hits
+    core.analysis_cache.clear()
+    start = time.perf_counter()
+    plan = core.compile_plan(text, settings, rng=core.PlanRandom(seed))
+    result['compile'] = {'seconds': time.perf_counter() - start, 'entries': len(plan)}
+
+    # throughput: nothing to wait for, so this measures the loop and the sink
+    fast = _zero_delay_plan(plan)
+    for name, burst in (('null', False), ('record', False), ('null_burst', True)):
+        backend = get_backend(name.split('_')[0])
+        cpu = time.process_time()
+        start = time.perf_counter()
+        core.execute_plan(fast, backend, burst=burst)
+        elapsed = time.perf_counter() - start
+        result[f'throughput_{name}'] = {
+            'seconds': elapsed,
+            'keys_per_second': plan.char_count / elapsed if elapsed else None,
+            'overhead_us_per_entry': elapsed / len(plan) * 1e6 if len(plan) else None,
+            'cpu_seconds': time.process_time() - cpu,
+        }
+
+    # jitter: real waits on a time-scaled window of the plan
+    window = _window(plan, time_scale, jitter_seconds)
+    scheduler = _TracingScheduler()
+    cpu = time.process_time()
+    core.execute_plan(window, get_backend('record'), scheduler=scheduler)
+    report = scheduler.report()
+    lateness_ms = [x * 1e3 for x in scheduler.lateness]
+    result['jitter'] = {
+        'time_scale': time_scale,
+        'entries': len(window),
+        'lateness_ms': percentiles(lateness_ms),
+        'drift_seconds': report['drift_seconds'],
+        'cpu_percent': 100 * (time.process_time() - cpu) / report['actual_seconds'] if report['actual_seconds'] else None,
+    }
+    return result
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(SIZES), help="comma-separated corpus sizes (%(default)s)")
+    parser.add_argument('--presets', default=','.join(core.PRESETS), help="comma-separated presets (%(default)s)")
+    parser.add_argument('--time-scale', type=float, default=0.1, help="delay multiplier for the jitter run (%(default)s)")
+    parser.add_argument('--jitter-seconds', type=float, default=3.0, help="wall-clock budget per jitter run (%(default)s)")
+    parser.add_argument('--live-changes', type=int, default=3,
+                        help="settings changes during the live_settings run (%(default)s)")
+    parser.add_argument('--max-late-ms', type=float, default=50.0,
+                        help="flag live_settings runs with an entry later than this (%(default)s)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    results = []
+    flags = []
+    for size_name in args.sizes.split(','):
+        text = make_corpus(SIZES[size_name], args.seed)
+        for preset in args.presets.split(','):
+            settings = core.preset_settings(preset)
+            case = bench_case(text, settings, args.time_scale, args.jitter_seconds, args.seed)
+            case['live_settings'] = live = live_settings_case(text, settings, args.time_scale, args.jitter_seconds,
+                                                              args.live_changes, args.seed)
+            case.update(size=size_name, preset=preset)
+            results.append(case)
+            worst = live['lateness_ms'].get('max', 0)
+            if worst > args.max_late_ms:
+                flags.append(f"{size_name}/{preset}: an entry was {worst:.1f} ms late across "
+                             f"{live['changes']} settings changes")
+            print(f"{size_name:>6} {preset:<12} "
+                  f"{case['throughput_record']['keys_per_second']:>12,.0f} keys/s  "
+                  f"p99 late {case['jitter']['lateness_ms'].get('p99', 0):.2f} ms", file=sys.stderr)
+
+    report = {
+        'benchmark': 'keystroke-engine',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'results': results,
+        'flags': flags,
+    }
+    out = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(out)
+    else:
+        print(out)
+    for flag in flags:
+        print(f"FLAG {flag}", file=sys.stderr)
+    return 1 if flags else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
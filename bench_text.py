@@ -0,0 +1,455 @@
+"""Text-analysis benchmarks and regression checks.
+
+Times the sentence analysis that runs on every edit and before every run
+(is_sentence_terminator, split_into_sentences, classify_sentence, the ETA
+estimate and what they are built on) over generated corpora, records the peak
+memory of each stage, and checks the results:
+
+    python bench_text.py                                  # 1k-1m chars, every corpus kind
+    python bench_text.py --sizes 1m,16m,32m --kinds mixed --no-memory
+    python bench_text.py --sizes 16m --kinds mixed --workers 8  # parallel analysis on 8 cores
+    python bench_text.py --save-baseline text_baseline.json
+    python bench_text.py --baseline text_baseline.json    # exit status 1 on any flag
+
+Corpora are generated from a seed, per kind: prose, dialog, lists, quotes
+(straight and curly, nested, spanning paragraphs, apostrophes), abbrev (every
+entry of core._ABBREVIATIONS mid-sentence and at sentence ends) and mixed.
+
+Flags are raised when
+  - the equivalent paths disagree: index_sentences vs split_into_sentences,
+    classify_sentence vs classify_sentences, IncrementalAnalyzer vs both, the
+    cached vs uncached ETA, the serial vs parallel document analysis;
+  - the paragraph-wise analysis (IncrementalAnalyzer, the streamed
+    multipliers) disagrees with the whole-text one on one of --fuzz short
+    random texts built from FUZZ_PIECES;
+  - a stage that should be linear grows faster than that between two sizes of
+    at least SCALING_MIN_CHARS (exponent above --max-exponent);
+  - with --baseline: sentence boundaries, tags or terminator decisions changed
+    (with the first block of SENTENCES_PER_DIGEST that differs), or a stage that
+    took at least BASELINE_MIN_SECONDS got slower than --tolerance times its baseline.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import platform
+import random
+import re
+import sys
+import time
+import tracemalloc
+from array import array
+from collections import Counter
+
+import core
+from core import (_ABBREVIATIONS, DocumentAnalysis, IncrementalAnalyzer, analyze_parallel, build_multiplier_map,
+                  classify_sentence, classify_sentences, estimate_typing_seconds, index_sentences,
+                  iter_block_multipliers, iter_paragraph_blocks, is_sentence_terminator, split_into_sentences)
+
+
+SIZES = {
+    '1k': 1_000,
+    '64k': 64_000,
+    '1m': 1_000_000,
+    '16m': 16_000_000,
+    '32m': 32_000_000,
+}
+DEFAULT_SIZES = '1k,64k,1m'
+
+# classify_sentence looks back over the whole text, so it is quadratic over a document by
+# design; above this size it runs on CLASSIFY_SAMPLE evenly spaced sentences only
+CLASSIFY_ALL_CHARS = 256_000
+CLASSIFY_SAMPLE = 256
+# Sizes below this are too quick for a meaningful scaling exponent
+SCALING_MIN_CHARS = 64_000
+# Stages quicker than this in the baseline are too noisy to compare times
+BASELINE_MIN_SECONDS = 0.002
+# Sentences per digest, so a changed boundary or tag can be located
+SENTENCES_PER_DIGEST = 4096
+# Tag order of the per-sentence bitmask that is digested
+TAG_BITS = ('quote', 'analysis', 'context', 'dialog', 'list', 'long')
+
+_WORDS = ("time year people way day man thing woman life child world school state family student group "
+          "country problem hand part place case week company system program question work government number "
+          "night point home water room mother area money story fact month lot right study book eye job word "
+          "business issue side kind head house service friend father power hour game line end member law car "
+          "city community name president team minute idea kid body information back parent face others level "
+          "office door health person art war history party result change morning reason research girl guy "
+          "moment air teacher force education").split()
+_NAMES = ('Anna', 'Bob', 'Clara', 'David', 'Elena', 'Farid', 'Grace', 'Hugo', 'Ines', 'Jonas')
+_LEADINS = ('However, ', 'In conclusion, ', 'Overall, ', 'Therefore ', 'Moreover, ', 'Note: ', 'Importantly, ',
+            'Consequently, ', 'In summary, ', '')
+_TERMINATORS = ('.', '.', '.', '.', '?', '!', '...', '?!')
+
+
+def _words(rng, lo=4, hi=14) -> str:
+    return ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(lo, hi)))
+
+
+def _sentence(rng, long_chance=0.05) -> str:
+    body = _words(rng, 20, 45) if rng.random() < long_chance else _words(rng)
+    if rng.random() < 0.2:
+        body += f" ({_words(rng, 2, 5)})"
+    if rng.random() < 0.15:
+        body += f", {_words(rng, 2, 6)}"
+    leadin = rng.choice(_LEADINS)
+    if not leadin:
+        body = body[0].upper() + body[1:]
+    return leadin + body + rng.choice(_TERMINATORS)
+
+
+def _prose(rng) -> str:
+    return ' '.join(_sentence(rng, long_chance=0.15) for _ in range(rng.randint(2, 7)))
+
+
+def _dialog(rng) -> str:
+    lines = []
+    for _ in range(rng.randint(2, 6)):
+        style = rng.random()
+        if style < 0.35:
+            lines.append(f"{rng.choice(_NAMES)}: {_sentence(rng)}")
+        elif style < 0.6:
+            lines.append(f"— {_sentence(rng)}")
+        elif style < 0.8:
+            lines.append(f'"{_sentence(rng)}" {rng.choice(_NAMES)} said. "{_sentence(rng)}"')
+        else:
+            lines.append(f"- {_sentence(rng)}")
+    return '\n'.join(lines)
+
+
+def _lists(rng) -> str:
+    lines = [_sentence(rng)[:-1] + ':']
+    numbered = rng.random() < 0.4
+    for n in range(1, rng.randint(3, 9)):
+        marker = f"{n}." if numbered else rng.choice('-*•')
+        item = _words(rng, 1, 8)
+        lines.append(f"{marker} {item}{rng.choice(('', '', '.', ';'))}")
+    if rng.random() < 0.5:
+        lines.append(_sentence(rng))
+    return '\n'.join(lines)
+
+
+def _quotes(rng) -> str:
+    parts = []
+    for _ in range(rng.randint(2, 6)):
+        style = rng.random()
+        s = _sentence(rng)
+        if style < 0.25:
+            parts.append(f'"{s}"')
+        elif style < 0.45:
+            parts.append(f"“{s}” {_sentence(rng)}")
+        elif style < 0.6:
+            parts.append(f"'{s}' she wrote, quoting '{_words(rng, 1, 4)}'.")
+        elif style < 0.7:
+            parts.append(f'"{s} \'{_words(rng, 2, 5)}\', {_words(rng, 2, 5)}."')
+        elif style < 0.8:
+            # apostrophes flip the single-quote parity, as they do in real text
+            parts.append(f"It's {rng.choice(_NAMES)}'s {_words(rng, 2, 6)}, isn't it?")
+        elif style < 0.9:
+            # an opening quote closed in a later paragraph
+            parts.append(f'"{s}')
+        else:
+            parts.append(s)
+    return ' '.join(parts)
+
+
+_ABBREVIATION_FORMS = sorted(_ABBREVIATIONS)
+
+
+def _abbrev(rng) -> str:
+    parts = []
+    for _ in range(rng.randint(2, 6)):
+        abbr = rng.choice(_ABBREVIATION_FORMS)
+        form = (abbr.capitalize() if rng.random() < 0.5 else abbr) + '.'
+        if rng.random() < 0.3:
+            # abbreviation ending the sentence
+            parts.append(f"{_sentence(rng)[:-1]} {form}")
+        else:
+            parts.append(f"{_words(rng, 2, 6).capitalize()} {form} {rng.choice(_NAMES)} {_words(rng, 2, 8)}"
+                         f"{rng.choice(_TERMINATORS)}")
+    return ' '.join(parts)
+
+
+KINDS = {
+    'prose': (_prose,),
+    'dialog': (_dialog,),
+    'lists': (_lists,),
+    'quotes': (_quotes,),
+    'abbrev': (_abbrev,),
+    'mixed': (_prose, _dialog, _lists, _quotes, _abbrev),
+}
+
+
+def make_corpus(kind: str, size: int, seed: int = 0) -> str:
+    """Return `size` characters of generated text of `kind` (see KINDS), cut into paragraphs."""
+    rng = random.Random(f"{kind}:{seed}")
+    makers = KINDS[kind]
+    parts = []
+    total = 0
+    while total < size:
+        para = rng.choice(makers)(rng)
+        if kind == 'mixed' and rng.random() < 0.05:
+            para = para.replace('\n', '\r\n')
+        parts.append(para)
+        total += len(para) + 2
+    return '\n\n'.join(parts)[:size]
+
+
+# Pieces the fuzz texts are made of: what decides where sentences end, merge and quotes
+# open, next to blank lines and line endings
+FUZZ_PIECES = ('a', 'b ', ' ', '.', '?', '!', '\n', '\n\n', '\r\n', '\r', '"', "'", '“', '”', '- ', '* ', '1. ',
+               'Bob: ', '— ', 'Mr.', 'e.g.', 'However ', 'x' * 201)
+FUZZ_MAX_PIECES = 14
+# Characters per chunk when the fuzz texts are streamed
+FUZZ_CHUNK = 3
+
+
+def fuzz_flags(cases: int, seed: int, settings: dict) -> list:
+    """Compare the paragraph-wise analyzers with the whole-text ones on `cases` random texts of FUZZ_PIECES."""
+    rng = random.Random(f"fuzz:{seed}")
+    analyzer = IncrementalAnalyzer()
+    for _ in range(cases):
+        text = ''.join(rng.choice(FUZZ_PIECES) for _ in range(rng.randint(0, FUZZ_MAX_PIECES)))
+        index = index_sentences(text)
+        tags = classify_sentences(index, index.text)
+        # a fresh analyzer, and one holding blocks of the earlier texts
+        if not IncrementalAnalyzer().tag_counts(text) == analyzer.tag_counts(text) == +Counter(map(frozenset, tags)):
+            return [f"fuzz: IncrementalAnalyzer.tag_counts differs from classify_sentences on {text!r}"]
+        # the CLI's streaming path, fed FUZZ_CHUNK characters at a time, against the whole-text map
+        normalized = index.text
+        chunks = (normalized[i:i + FUZZ_CHUNK] for i in range(0, len(normalized), FUZZ_CHUNK))
+        streamed = {}
+        offset = 0
+        for block, multipliers in iter_block_multipliers(iter_paragraph_blocks(chunks), settings):
+            streamed.update((offset + i, m) for i, m in multipliers.items())
+            offset += len(block)
+        if streamed != DocumentAnalysis.of(text, workers=1).multipliers(settings):
+            return [f"fuzz: iter_block_multipliers differs from build_multiplier_map on {text!r}"]
+    return []
+
+
+def _digests(data: bytes, item_size: int) -> list:
+    """Short sha1 digests of `data` in blocks of SENTENCES_PER_DIGEST items of `item_size` bytes."""
+    step = SENTENCES_PER_DIGEST * item_size
+    return [hashlib.sha1(data[i:i + step]).hexdigest()[:16] for i in range(0, max(len(data), 1), step)]
+
+
+def _tag_mask(tags) -> int:
+    return sum(1 << i for i, tag in enumerate(TAG_BITS) if tag in tags)
+
+
+def _measure(fn, repeat: int, memory: bool) -> tuple:
+    """(result, best seconds of `repeat` runs, peak bytes allocated by one run or None)."""
+    best = math.inf
+    result = None
+    for _ in range(repeat):
+        result = None
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    peak = None
+    if memory:
+        result = None
+        tracemalloc.start()
+        try:
+            result = fn()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, best, peak
+
+
+def bench_corpus(text: str, settings: dict, repeat: int, memory: bool, workers: int = 1) -> tuple:
+    """Run every stage on `text`, the parallel analysis with `workers` processes: returns (stages, digests, flags)."""
+    stages = {}
+    flags = []
+
+    def stage(name, fn, units, linear=True):
+        result, seconds, peak = _measure(fn, repeat, memory)
+        stages[name] = {'seconds': seconds, 'peak_bytes': peak, 'units': units, 'linear': linear}
+        return result
+
+    marks = [m.start() for m in re.finditer(r'[.!?]', text)]
+    terminators = stage('is_sentence_terminator', lambda: [is_sentence_terminator(text, i) for i in marks],
+                        len(marks))
+    sentences = stage('split_into_sentences', lambda: split_into_sentences(text), len(text))
+    index = stage('index_sentences', lambda: index_sentences(text), len(text))
+    if list(index) != sentences:
+        flags.append('index_sentences differs from split_into_sentences')
+
+    # both taggers work on the normalized text, as build_multiplier_map does
+    normalized = index.text
+    tags = stage('classify_sentences', lambda: classify_sentences(index, normalized), len(text))
+    if len(text) <= CLASSIFY_ALL_CHARS:
+        picks = range(len(sentences))
+    else:
+        picks = sorted({k * len(sentences) // CLASSIFY_SAMPLE for k in range(CLASSIFY_SAMPLE)})
+    single = stage('classify_sentence', lambda: [classify_sentence(sentences[k][2], normalized, sentences[k][0],
+                                                                   sentences[k][1]) for k in picks],
+                   len(picks), linear=False)
+    for k, got in zip(picks, single):
+        if got != tags[k]:
+            flags.append(f"classify_sentence differs from classify_sentences at sentence {k}: "
+                         f"{sorted(got)} vs {sorted(tags[k])}")
+            break
+
+    analyzer = IncrementalAnalyzer()
+    counts = stage('tag_counts', lambda: IncrementalAnalyzer().tag_counts(text), len(text))
+    if counts != +Counter(frozenset(t) for t in tags):
+        flags.append('IncrementalAnalyzer.tag_counts differs from classify_sentences')
+    analyzer.tag_counts(text)
+    # an edit in the middle paragraph, as in the editor: only that block is analyzed again
+    middle = text.find('\n\n', len(text) // 2)
+    edited = text if middle < 0 else text[:middle] + ' Edited here.' + text[middle:]
+    stage('tag_counts_after_edit', lambda: analyzer.tag_counts(edited), len(text))
+
+    # main.py's estimate_remaining_seconds: the rest of the text from the cursor, through the analyzer
+    idx = len(text) // 2
+    rest = text[idx:]
+    eta = stage('estimate_remaining_seconds',
+                lambda: estimate_typing_seconds(rest, settings, analyzer.tag_counts(rest)), len(rest))
+    if not math.isclose(eta, estimate_typing_seconds(rest, settings), rel_tol=1e-9):
+        flags.append('estimate_remaining_seconds with a warm analyzer differs from a fresh estimate')
+
+    def cold_multiplier_map():
+        core.analysis_cache.clear()
+        return build_multiplier_map(text, settings)
+
+    stage('build_multiplier_map', cold_multiplier_map, len(text))
+    # a document analyzed before: only the multipliers are computed
+    stage('build_multiplier_map_cached', lambda: build_multiplier_map(text, settings), len(text))
+
+    # the analysis behind the cache, in this process and in a pool; every size is cut into
+    # PARALLEL_CHUNKS_PER_WORKER chunks per worker, so the stitching is checked on small corpora too
+    serial = stage('analyze_document', lambda: core.DocumentAnalysis.of(text, workers=1), len(text))
+    chunk_chars = max(1, len(text) // (workers * core.PARALLEL_CHUNKS_PER_WORKER))
+    parallel = stage('analyze_parallel', lambda: analyze_parallel(text, workers, chunk_chars), len(text))
+    if parallel.ends != serial.ends or parallel.masks != serial.masks:
+        flags.append(f"analyze_parallel with {workers} workers differs from the serial analysis")
+
+    digests = {
+        'corpus': hashlib.sha1(text.encode('utf-8')).hexdigest()[:16],
+        'sentences': len(index),
+        'boundaries': _digests(array('q', [x for pair in zip(index.starts, index.ends) for x in pair]).tobytes(), 16),
+        'tags': _digests(bytes(_tag_mask(t) for t in tags), 1),
+        'terminators': _digests(bytes(terminators), 1),
+    }
+    return stages, digests, flags
+
+
+def scaling_flags(results, max_exponent: float) -> list:
+    """Flag linear stages whose time grows faster than n**max_exponent between two corpus sizes."""
+    flags = []
+    by_kind = {}
+    for case in results:
+        by_kind.setdefault(case['kind'], []).append(case)
+    for kind, cases in by_kind.items():
+        cases = sorted((c for c in cases if c['chars'] >= SCALING_MIN_CHARS), key=lambda c: c['chars'])
+        for small, large in zip(cases, cases[1:]):
+            for name, big in large['stages'].items():
+                little = small['stages'].get(name)
+                if not big['linear'] or not little or not little['seconds'] or little['units'] == big['units']:
+                    continue
+                exponent = (math.log(big['seconds'] / little['seconds'])
+                            / math.log(big['units'] / little['units']))
+                big.setdefault('exponent', {})[small['size']] = exponent
+                if exponent > max_exponent:
+                    flags.append(f"{kind}/{large['size']}: {name} scales as n^{exponent:.2f} from {small['size']}")
+    return flags
+
+
+def baseline_flags(results, baseline: dict, tolerance: float) -> list:
+    """Flag differences from a report saved with --save-baseline."""
+    flags = []
+    old = {(c['kind'], c['size']): c for c in baseline.get('results', [])}
+    for case in results:
+        key = f"{case['kind']}/{case['size']}"
+        before = old.get((case['kind'], case['size']))
+        if before is None:
+            continue
+        if before['digests']['corpus'] != case['digests']['corpus']:
+            flags.append(f"{key}: generated corpus changed, results not comparable")
+            continue
+        for part in ('boundaries', 'tags', 'terminators'):
+            a, b = before['digests'][part], case['digests'][part]
+            if a != b:
+                block = next((i for i, (x, y) in enumerate(zip(a, b)) if x != y), min(len(a), len(b)))
+                flags.append(f"{key}: {part} changed from sentence {block * SENTENCES_PER_DIGEST} "
+                             f"({before['digests']['sentences']} -> {case['digests']['sentences']} sentences)")
+        for name, now in case['stages'].items():
+            then = before['stages'].get(name)
+            if then and then['seconds'] >= BASELINE_MIN_SECONDS and now['seconds'] > then['seconds'] * tolerance:
+                flags.append(f"{key}: {name} took {now['seconds'] / then['seconds']:.1f}x its baseline time")
+    return flags
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f"comma-separated corpus sizes out of "
+                                                               f"{', '.join(SIZES)} (%(default)s)")
+    parser.add_argument('--kinds', default=','.join(KINDS), help="comma-separated corpus kinds (%(default)s)")
+    parser.add_argument('--preset', default='normal', choices=sorted(core.PRESETS),
+                        help="settings for the ETA and multiplier stages (%(default)s)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per stage, best is kept (%(default)s)")
+    parser.add_argument('--no-memory', action='store_true', help="skip the (slower) peak memory runs")
+    parser.add_argument('--fuzz', type=int, default=2000, metavar='N',
+                        help="random texts to check the paragraph-wise analysis on (%(default)s)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="processes for the analyze_parallel stage (%(default)s)")
+    parser.add_argument('--max-exponent', type=float, default=1.3,
+                        help="flag linear stages scaling worse than n**EXPONENT (%(default)s)")
+    parser.add_argument('--baseline', help="compare boundaries, tags and times with this saved report")
+    parser.add_argument('--tolerance', type=float, default=3.0,
+                        help="flag stages slower than this many times their baseline (%(default)s)")
+    parser.add_argument('--save-baseline', metavar='PATH', help="also write the report here, to compare against later")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    settings = core.preset_settings(args.preset)
+    results = []
+    flags = []
+    for kind in args.kinds.split(','):
+        for size_name in args.sizes.split(','):
+            text = make_corpus(kind, SIZES[size_name], args.seed)
+            stages, digests, case_flags = bench_corpus(text, settings, args.repeat, not args.no_memory,
+                                                        args.workers)
+            results.append({'kind': kind, 'size': size_name, 'chars': len(text), 'stages': stages, 'digests': digests})
+            flags.extend(f"{kind}/{size_name}: {flag}" for flag in case_flags)
+            slowest = max(stages, key=lambda name: stages[name]['seconds'])
+            print(f"{kind:>7} {size_name:>4} {digests['sentences']:>9,} sentences  "
+                  f"split {stages['split_into_sentences']['seconds'] * 1e3:9.1f} ms  "
+                  f"slowest {slowest} {stages[slowest]['seconds'] * 1e3:.1f} ms", file=sys.stderr)
+
+    flags.extend(fuzz_flags(args.fuzz, args.seed, settings))
+    flags.extend(scaling_flags(results, args.max_exponent))
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            flags.extend(baseline_flags(results, json.load(f), args.tolerance))
+
+    report = {
+        'benchmark': 'text-analysis',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'seed': args.seed,
+        'preset': args.preset,
+        'workers': args.workers,
+        'fuzz_cases': args.fuzz,
+        'results': results,
+        'flags': flags,
+    }
+    out = json.dumps(report, indent=2)
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(out)
+    if not args.output:
+        print(out)
+    for flag in flags:
+        print(f"FLAG {flag}", file=sys.stderr)
+    return 1 if flags else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
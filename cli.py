@@ -0,0 +1,151 @@
+"""Headless command-line entry point.
+
+Types a document into the focused window without opening the GUI:
+
+    python cli.py essay.txt                       # settings from config.json
+    cat essay.txt | python cli.py - --preset deep
+    python cli.py notes.txt --config other.json --backend xtest --delay 5
+    python cli.py essay.txt --record run.htlog    # later: python cli.py --replay run.htlog
+
+The text is read in chunks and cut into paragraphs; each paragraph is analyzed,
+compiled into a keystroke plan and typed while the rest is still being read, so
+typing starts after the first paragraph instead of after the whole document.
+Settings use the same keys as config.json; without an input file the config's
+document ('text_file', or inline 'text_to_type' in older configs) is typed.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import core
+from backends import OUTPUT_BACKENDS, get_backend, is_failsafe_abort
+from eventlog import EventLog, replay
+from instrument import RunTrace, write_report
+from layouts import LAYOUTS
+from storage import load_config, open_document
+
+
+def read_chunks(stream, chunk_size: int):
+    """Yield the stream's text `chunk_size` characters at a time."""
+    return iter(lambda: stream.read(chunk_size), '')
+
+
+def type_stream(chunks, settings: dict, backend, rng=random, scheduler=None, trace=None, log=None):
+    """Analyze, compile and type a stream of text chunks paragraph by paragraph.
+
+    Returns (characters typed, scheduler report). `trace` (an instrument.RunTrace)
+    records the timing of the whole stream and `log` (an eventlog.EventLog) its keystrokes.
+    """
+    if scheduler is None:
+        scheduler = core.DeadlineScheduler()
+    scheduler.start()
+    typed = 0
+    blocks = core.iter_paragraph_blocks(chunks)
+    for block, multipliers in core.iter_block_multipliers(blocks, settings):
+        plan = core.compile_plan(block, settings, rng=rng, multipliers=multipliers)
+        typed += core.execute_plan(plan, backend, scheduler=scheduler, restart=False, trace=trace,
+                                   burst=settings.get('burst_mode', False), log=log)
+    return typed, scheduler.report()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Type a document into the focused window, like a human would.")
+    parser.add_argument('input', nargs='?', help="text file to type, or '-' for stdin (default: the config's text_file)")
+    parser.add_argument('--config', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json'),
+                        help="settings file with config.json keys (default: %(default)s)")
+    parser.add_argument('--preset', choices=sorted(core.PRESETS), help="apply a preset on top of the config")
+    parser.add_argument('--wpm', type=float, help="override typing_speed_wpm")
+    parser.add_argument('--layout', choices=list(LAYOUTS), help="keyboard layout for typos (default: config's keyboard_layout or qwerty)")
+    parser.add_argument('--backend', choices=list(OUTPUT_BACKENDS), help="output backend (default: config's output_backend or pyautogui)")
+    parser.add_argument('--delay', type=float, default=3.0, help="seconds to wait before typing, to focus the target window (default: %(default)s)")
+    parser.add_argument('--chunk-size', type=int, default=64 * 1024, help="characters read per chunk (default: %(default)s)")
+    parser.add_argument('--encoding', default='utf-8', help="encoding of the input file (default: %(default)s)")
+    parser.add_argument('--burst', action='store_true', help="send runs of keys as one backend call (for very high WPM)")
+    parser.add_argument('--seed', type=int, help="random seed; the same seed, text and settings reproduce a run exactly")
+    parser.add_argument('--report', metavar='PATH', help="record per-run timing and write it here (.json or .csv)")
+    parser.add_argument('--record', metavar='PATH', help="log every keystroke and its time to this binary file")
+    parser.add_argument('--replay', metavar='PATH', help="type a run logged with --record again instead of a document")
+    parser.add_argument('-q', '--quiet', action='store_true', help="no status output on stderr")
+    return parser
+
+
+def resolve_settings(config: dict, preset=None, wpm=None, layout=None) -> dict:
+    """Timing settings from a config, with an optional preset, WPM and layout applied on top."""
+    settings = dict(core.DEFAULT_SETTINGS)
+    settings.update({k: config[k] for k in core.DEFAULT_SETTINGS if k in config})
+    if preset:
+        settings = core.preset_settings(preset, settings)
+    if wpm is not None:
+        settings['typing_speed_wpm'] = wpm
+    if layout:
+        settings['keyboard_layout'] = layout
+    return settings
+
+
+def main_cli(argv=None):
+    args = build_parser().parse_args(argv)
+    config = load_config(args.config)
+    settings = resolve_settings(config, args.preset, args.wpm, args.layout)
+    if args.burst:
+        settings['burst_mode'] = True
+    backend_name = args.backend or config.get('output_backend', 'pyautogui')
+
+    def status(msg):
+        if not args.quiet:
+            print(msg, file=sys.stderr)
+
+    if args.replay:
+        stream = None
+    elif args.input is None:
+        stream = open_document(config, args.config, args.encoding)
+        if stream is None:
+            status("Nothing to type: the config's text file does not exist.")
+            return 2
+    elif args.input == '-':
+        stream = sys.stdin
+    else:
+        stream = open(args.input, 'r', encoding=args.encoding)
+
+    backend = get_backend(backend_name)
+    trace = RunTrace() if args.report else None
+    log = EventLog(args.record) if args.record else None
+    rng = core.PlanRandom(args.seed)
+    try:
+        if args.delay > 0:
+            status(f"Typing starts in {args.delay:g}s; focus the target window now.")
+            time.sleep(args.delay)
+        if args.replay:
+            scheduler = core.DeadlineScheduler()
+            typed = replay(args.replay, backend, scheduler=scheduler, trace=trace, log=log)
+            report = scheduler.report()
+        else:
+            status(f"Seed {rng.seed} ({rng.backend} generator).")
+            typed, report = type_stream(read_chunks(stream, args.chunk_size), settings, backend, rng=rng,
+                                        trace=trace, log=log)
+        status(f"Done: {typed} characters in {report['actual_seconds']:.1f}s "
+               f"(drift {report['drift_seconds']:+.2f}s).")
+        return 0
+    except KeyboardInterrupt:
+        status("Interrupted.")
+        return 130
+    except Exception as e:
+        if not is_failsafe_abort(e):
+            raise
+        status("Aborted by PyAutoGUI failsafe (mouse moved to corner).")
+        return 1
+    finally:
+        backend.close()
+        if stream is not None and stream is not sys.stdin:
+            stream.close()
+        if log is not None:
+            log.close()
+            status(f"Keystroke log written to {args.record}.")
+        if trace is not None:
+            write_report(trace.report(settings), args.report)
+            status(f"Timing report written to {args.report}.")
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
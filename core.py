@@ -0,0 +1,1500 @@
+"""GUI-free core of HumanTyper: text analysis, the timing model and keystroke plans.
+
+Nothing here imports tkinter or an input library, so tools that only need analysis
+or ETAs (the CLI, benchmarks) import it in a few milliseconds. Keys are emitted
+through the output backends in backends.py.
+"""
+import bisect
+import hashlib
+import math
+import os
+import random
+import re
+import struct
+import sys
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict
+from collections.abc import Mapping
+
+from layouts import DEFAULT_LAYOUT, get_layout
+from storage import atomic_write_bytes
+
+
+def get_nearby_char(target: str, rng=random, layout: str = DEFAULT_LAYOUT) -> str:
+    """Return a nearby (adjacent-key) character for the given target char on keyboard `layout`.
+
+    See layouts.py; characters the layout does not have fall back to a random letter.
+    """
+    return get_layout(layout).nearby(target, rng)
+
+
+# Abbreviations to ignore when deciding if a period ends a sentence
+_ABBREVIATIONS = {"e.g", "i.e", "mr", "mrs", "dr", "jr", "sr", "vs", "etc", "prof", "rev", "st", "rd", "ave"}
+
+
+def is_sentence_terminator(text: str, idx: int) -> bool:
+    """Return True if the character at text[idx] is a real sentence terminator.
+
+    Avoid treating common abbreviations like 'e.g.' or 'Mr.' as sentence ends.
+    """
+    if idx < 0 or idx >= len(text):
+        return False
+    ch = text[idx]
+    if ch not in '.!?':
+        return False
+
+    # look backwards to find the word before the punctuation
+    j = idx - 1
+    while j >= 0 and text[j].isspace():
+        j -= 1
+    # collect letters/dots from the previous token up to some reasonable length
+    start = j
+    while start >= 0 and (text[start].isalpha() or text[start] == '.'):
+        start -= 1
+    word = text[start+1:j+1].lower()
+    # strip trailing dot parts
+    word = word.rstrip('.')
+    if not word:
+        return True
+    if word in _ABBREVIATIONS:
+        return False
+    return True
+
+
+def _ends_with_abbreviation(tail: str) -> bool:
+    """Return True if `tail` (the last few characters of a sentence) ends with an abbreviation and '.'."""
+    low = tail[-5:].lower()
+    if not low.endswith('.'):
+        return False
+    # abbreviations are 2-4 characters long; check each suffix before the dot
+    return low[-3:-1] in _ABBREVIATIONS or low[-4:-1] in _ABBREVIATIONS or low[-5:-1] in _ABBREVIATIONS
+
+
+# A raw sentence: any first character, then up to and including a run of terminators, a newline or the end
+_SENTENCE_RE = re.compile(r'.[^.?!\n]*(?:[.?!]+|\n|$)', re.DOTALL)
+_NON_SPACE_RE = re.compile(r'\S')
+# Lines merged into the previous sentence: bullets/numbered items and dialog
+_BULLET_RE = re.compile(r'([-*•]|\d+\.)\s+')
+_DIALOG_LINE_RE = re.compile(r'—|-|[A-Z][a-z]+:')
+
+
+class SentenceIndex:
+    """Sentence boundaries of a text as compact integer offset arrays.
+
+    `starts`/`ends` hold the same (start, end) pairs split_into_sentences returns.
+    Sentence text is only built when asked for, by slicing the stripped pieces a
+    sentence is made of (more than one when bullet/dialog lines were merged into it).
+    """
+    __slots__ = ('text', 'starts', 'ends', 'first_piece', 'piece_starts', 'piece_ends', 'piece_seps')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.starts = array('q')
+        self.ends = array('q')
+        self.first_piece = array('q')
+        self.piece_starts = array('q')
+        self.piece_ends = array('q')
+        self.piece_seps = array('B')  # code point of the separator joining a piece to the previous one
+
+    def __len__(self):
+        return len(self.starts)
+
+    def sentence_text(self, k: int) -> str:
+        """Stripped text of sentence `k`."""
+        t = self.text
+        first = self.first_piece[k]
+        stop = self.first_piece[k + 1] if k + 1 < len(self.first_piece) else len(self.piece_starts)
+        if stop - first == 1:
+            return t[self.piece_starts[first]:self.piece_ends[first]]
+        parts = [t[self.piece_starts[first]:self.piece_ends[first]]]
+        for p in range(first + 1, stop):
+            parts.append(chr(self.piece_seps[p]))
+            parts.append(t[self.piece_starts[p]:self.piece_ends[p]])
+        return ''.join(parts)
+
+    def __getitem__(self, k: int):
+        if k < 0:
+            k += len(self.starts)
+        return self.starts[k], self.ends[k], self.sentence_text(k)
+
+    def __iter__(self):
+        for k in range(len(self.starts)):
+            yield self[k]
+
+
+def index_sentences(text: str) -> SentenceIndex:
+    """Split `text` into sentences, returning a SentenceIndex.
+
+    Same boundaries as split_into_sentences, without building a string per sentence.
+    """
+    # Normalize line endings
+    t = text.replace('\r\n', '\n').replace('\r', '\n')
+    index = SentenceIndex(t)
+    starts, ends, first_piece = index.starts, index.ends, index.first_piece
+    piece_starts, piece_ends, piece_seps = index.piece_starts, index.piece_ends, index.piece_seps
+    find_non_space = _NON_SPACE_RE.search
+    for m in _SENTENCE_RE.finditer(t):
+        start, end = m.span()
+        first = find_non_space(t, start, end)
+        if first is None:
+            # whitespace only
+            continue
+        b = first.start()
+        e = end
+        while t[e - 1].isspace():
+            e -= 1
+        # avoid splitting on common abbreviations; the text is dropped like before
+        if t[e - 1] == '.' and _ends_with_abbreviation(t[max(b, e - 5):e]):
+            continue
+        if starts:
+            sep = _merge_separator(t, b, e)
+            if sep is not None:
+                # merge bullets/dialog into the previous sentence
+                piece_starts.append(b)
+                piece_ends.append(e)
+                piece_seps.append(ord(sep))
+                ends[-1] = end
+                continue
+        starts.append(start)
+        ends.append(end)
+        first_piece.append(len(piece_starts))
+        piece_starts.append(b)
+        piece_ends.append(e)
+        piece_seps.append(0)
+    return index
+
+
+def split_into_sentences(text: str):
+    """Regex-based sentence splitter that returns (start,end,sentence_text).
+
+    This uses punctuation-based splitting but tries to avoid common abbreviation splits and keeps
+    dialog/list lines together when possible. See index_sentences for a compact form.
+    """
+    return list(index_sentences(text))
+
+
+def _merge_separator(s: str, pos: int = 0, endpos: int = None):
+    """Return the separator used to merge sentence s[pos:endpos] into the previous one, or None."""
+    if endpos is None:
+        endpos = len(s)
+    # if current sentence is a single bullet/numbered line, merge
+    if _BULLET_RE.match(s, pos, endpos):
+        return '\n'
+    # if current looks like dialog (starts with em-dash or name:), merge
+    if _DIALOG_LINE_RE.match(s, pos, endpos):
+        return ' '
+    return None
+
+
+def classify_sentence(sent_text: str, full_text: str, start_idx: int, end_idx: int):
+    """Return a richer set of tags for the sentence.
+
+    Tags: quote, analysis, context, dialog, list, long
+    """
+    s = sent_text.strip()
+    in_quotes = False
+    if not (s.startswith(_OPEN_QUOTES) or s.endswith(_CLOSE_QUOTES)):
+        before = full_text[:start_idx]
+        in_quotes = before.count('"') % 2 == 1 or before.count("'") % 2 == 1
+    return sentence_tags(s, in_quotes)
+
+
+_OPEN_QUOTES = ('"', '“', "'", '‘')
+_CLOSE_QUOTES = ('"', '”', "'", '’')
+
+
+# Precompiled matchers for sentence_tags
+_DIALOG_RE = re.compile(r'[\-—]|[A-Z][a-z]+:\s')
+_ANALYSIS_RE = re.compile(r'\(|note:|however|i\.e\.|e\.g\.|viz|namely')
+_CONTEXT_LEADINS = ('in conclusion', 'overall', 'context:', 'importantly', 'moreover', 'in summary', 'to conclude', 'therefore', 'consequently')
+
+
+def sentence_tags(sent_text: str, in_quotes: bool):
+    """Tag a sentence given whether an odd number of quote marks precede it.
+
+    This is classify_sentence without the look-back over the full text.
+    """
+    tags = set()
+    s = sent_text.strip()
+    lower = s.lower()
+
+    # quote detection: starts/ends with quotes or enclosed
+    if in_quotes or s.startswith(_OPEN_QUOTES) or s.endswith(_CLOSE_QUOTES):
+        tags.add('quote')
+
+    # dialog detection: em-dash, leading speaker tag or lines with quotes
+    if _DIALOG_RE.match(s) or lower.startswith('said '):
+        tags.add('dialog')
+
+    # list detection: leading bullet or numbered markers
+    if _BULLET_RE.match(s):
+        tags.add('list')
+
+    # analysis detection: parentheses, 'note:', 'however', i.e./e.g.
+    if _ANALYSIS_RE.search(lower) or ':' in s[:20]:
+        tags.add('analysis')
+
+    # context detection: common lead-ins
+    if lower.startswith(_CONTEXT_LEADINS):
+        tags.add('context')
+
+    # long sentence
+    if len(s) > 200:
+        tags.add('long')
+
+    return tags
+
+
+def iter_in_quotes(sentences, full_text: str, dq: int = 0, sq: int = 0):
+    """Yield, for each (start, end, sentence_text), whether an odd number of quotes precede it.
+
+    `dq`/`sq` are the double/single quote parities at the start of `full_text`, for
+    text that continues an earlier chunk. `sentences` must be ordered by start.
+    """
+    pos = 0
+    for start, end, s in sentences:
+        if start > pos:
+            dq ^= full_text.count('"', pos, start) & 1
+            sq ^= full_text.count("'", pos, start) & 1
+            pos = start
+        yield bool(dq or sq)
+
+
+def classify_sentences(sentences, full_text: str):
+    """Tag every (start, end, sentence_text) in one pass over `full_text`.
+
+    Equivalent to calling classify_sentence for each sentence, but the quote parity
+    is carried forward between sentences so the whole document is linear time.
+    `sentences` must be ordered by start, as split_into_sentences returns them.
+    """
+    return [sentence_tags(s, in_quotes)
+            for (start, end, s), in_quotes in zip(sentences, iter_in_quotes(sentences, full_text))]
+
+
+def _is_paragraph_cut(t: str, cut: int) -> bool:
+    """Whether `t` can be cut after the blank line t[cut:cut + 2] without moving a sentence boundary.
+
+    Not when a newline or .?! follows: there a sentence match of the whole text can start
+    on the blank line and end on what follows.
+    """
+    return t[cut + 2:cut + 3] not in ('\n', '.', '?', '!')
+
+
+class IncrementalAnalyzer:
+    """Sentence tags for a document, cached per paragraph so edits only re-analyze what changed.
+
+    The text is cut after each blank line that _is_paragraph_cut allows; sentences never span those cuts except when a
+    bullet/dialog line is merged into the previous sentence, which is patched up when the
+    blocks are stitched back together. Quote parity is tracked per block, so a cached
+    block stays valid whatever precedes it.
+    """
+
+    def __init__(self):
+        self._blocks = {}
+
+    @staticmethod
+    def _analyze_block(block: str):
+        index = index_sentences(block)
+        sentences = []
+        pos = dq = sq = 0
+        for k in range(len(index)):
+            start, s = index.starts[k], index.sentence_text(k)
+            # quote parity of the block up to this sentence
+            dq ^= block.count('"', pos, start) % 2
+            sq ^= block.count("'", pos, start) % 2
+            pos = start
+            sentences.append((s, dq, sq, frozenset(sentence_tags(s, False))))
+        # whether the first line of the block (not the sentence it grew into) merges backwards
+        merge_sep = _merge_separator(block, index.piece_starts[0], index.piece_ends[0]) if sentences else None
+        return sentences, block.count('"') % 2, block.count("'") % 2, merge_sep
+
+    def tag_counts(self, text: str) -> Counter:
+        """Return a Counter of frozenset(tags) -> number of sentences in `text`."""
+        t = text.replace('\r\n', '\n').replace('\r', '\n')
+        old, cache = self._blocks, {}
+        counts = Counter()
+        dq = sq = 0
+        last = None  # (text, dq, sq) of the last sentence seen, for cross-block merges
+        last_tags = None
+        # one block per paragraph: a cut after every blank line _is_paragraph_cut allows
+        for _, block in _paragraph_chunks(t, 0):
+            info = cache.get(block) or old.get(block)
+            if info is None:
+                info = self._analyze_block(block)
+            cache[block] = info
+            sentences, block_dq, block_sq, merge_sep = info
+            if sentences:
+                first = 0
+                if merge_sep is not None and last is not None:
+                    # the block's first sentence continues the previous one
+                    counts[last_tags] -= 1
+                    merged = (last[0] + merge_sep + sentences[0][0]).strip()
+                    last = (merged, last[1], last[2])
+                    last_tags = frozenset(sentence_tags(merged, bool(last[1] or last[2])))
+                    counts[last_tags] += 1
+                    first = 1
+                for s, local_dq, local_sq, tags in sentences[first:]:
+                    s_dq, s_sq = dq ^ local_dq, sq ^ local_sq
+                    last_tags = tags | {'quote'} if s_dq or s_sq else tags
+                    counts[last_tags] += 1
+                    last = (s, s_dq, s_sq)
+            dq ^= block_dq
+            sq ^= block_sq
+        self._blocks = cache
+        return +counts
+
+
+def delay_per_char(wpm: float) -> float:
+    """Return the delay (in seconds) between characters for the given WPM."""
+    # 5 characters per word
+    characters_per_second = float(wpm) * 5 / 60
+    # Delay is the reciprocal
+    if characters_per_second > 0:
+        return 1 / characters_per_second
+    return 0.1 # Default safe minimum delay
+
+
+def sentence_multiplier(tags, settings) -> float:
+    """Return the pause multiplier for a sentence with the given tags."""
+    multiplier = 1.0
+    if 'quote' in tags:
+        multiplier *= float(settings['quote_sentence_multiplier'])
+    if 'analysis' in tags or 'long' in tags:
+        multiplier *= float(settings['analysis_sentence_multiplier'])
+    if 'context' in tags:
+        multiplier *= float(settings['context_sentence_multiplier'])
+    # dialog/list have smaller pauses
+    if 'dialog' in tags or 'list' in tags:
+        multiplier *= 0.7
+    return multiplier
+
+
+def build_multiplier_map(text: str, settings) -> dict:
+    """Map the index of each sentence's last character to its pause multiplier.
+
+    The sentence analysis comes from analysis_cache; only the multipliers are
+    computed from `settings`.
+    """
+    return analysis_cache.get(text).multipliers(settings)
+
+
+# Bump when sentence splitting or tagging changes, so cached analyses are not reused
+ANALYSIS_VERSION = 1
+# Tag order of DocumentAnalysis.masks
+ANALYSIS_TAGS = ('quote', 'analysis', 'context', 'dialog', 'list', 'long')
+# Analyses kept in memory, and on disk when the cache has a directory
+ANALYSIS_MEMORY_ENTRIES = 8
+ANALYSIS_DISK_ENTRIES = 64
+
+# Texts at least this long are analyzed in a process pool when there is more than one core
+PARALLEL_ANALYSIS_CHARS = 4_000_000
+# Chunks handed to each worker (for load balancing), and the smallest chunk worth a task
+PARALLEL_CHUNKS_PER_WORKER = 4
+PARALLEL_CHUNK_MIN_CHARS = 256_000
+
+_ANALYSIS_HEADER = struct.Struct('<4sHQ')  # magic, ANALYSIS_VERSION, number of sentences
+_ANALYSIS_MAGIC = b'HTAN'
+
+
+class DocumentAnalysis:
+    """The settings-independent result of analyzing a text: where each sentence ends and its tags.
+
+    `ends` are the sentence end offsets (as in index_sentences) and `masks` the tags
+    of each sentence as bits in ANALYSIS_TAGS order.
+    """
+    __slots__ = ('ends', 'masks')
+
+    def __init__(self, ends, masks):
+        self.ends = ends
+        self.masks = masks
+
+    @classmethod
+    def of(cls, text: str, workers=None):
+        """Analyze `text`; long texts go to analyze_parallel with `workers` processes (default: one per core)."""
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers > 1 and len(text) >= PARALLEL_ANALYSIS_CHARS:
+            # imported here: most texts never need a pool, and it would slow down `import core`
+            from concurrent.futures.process import BrokenProcessPool
+            try:
+                return analyze_parallel(text, workers)
+            except (OSError, BrokenProcessPool):
+                # no processes here (sandbox, resource limits): analyze in this one
+                pass
+        index = index_sentences(text)
+        # quote parity is counted in the normalized text the offsets refer to
+        masks = array('B', (_tags_mask(tags) for tags in classify_sentences(index, index.text)))
+        return cls(index.ends, masks)
+
+    def multipliers(self, settings) -> dict:
+        """Map the index of each sentence's last character to its pause multiplier under `settings`."""
+        by_mask = {}
+        for mask in set(self.masks):
+            by_mask[mask] = sentence_multiplier(_mask_tags(mask), settings)
+        return {end - 1: by_mask[mask] for end, mask in zip(self.ends, self.masks)}
+
+    def tag_counts(self) -> Counter:
+        """Counter of frozenset(tags) -> number of sentences, as IncrementalAnalyzer.tag_counts."""
+        return Counter({_mask_tags(mask): n for mask, n in Counter(self.masks).items()})
+
+    def to_bytes(self) -> bytes:
+        ends = array('q', self.ends)
+        if sys.byteorder == 'big':
+            ends.byteswap()
+        header = _ANALYSIS_HEADER.pack(_ANALYSIS_MAGIC, ANALYSIS_VERSION, len(ends))
+        return header + ends.tobytes() + self.masks.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        """Inverse of to_bytes; None if `data` is not a complete analysis of this ANALYSIS_VERSION."""
+        if len(data) < _ANALYSIS_HEADER.size:
+            return None
+        magic, version, count = _ANALYSIS_HEADER.unpack_from(data)
+        if magic != _ANALYSIS_MAGIC or version != ANALYSIS_VERSION:
+            return None
+        split = _ANALYSIS_HEADER.size + 8 * count
+        if len(data) != split + count:
+            return None
+        ends = array('q', data[_ANALYSIS_HEADER.size:split])
+        if sys.byteorder == 'big':
+            ends.byteswap()
+        return cls(ends, array('B', data[split:]))
+
+
+def _mask_tags(mask: int) -> frozenset:
+    return frozenset(tag for i, tag in enumerate(ANALYSIS_TAGS) if mask >> i & 1)
+
+
+def _tags_mask(tags) -> int:
+    return sum(1 << i for i, tag in enumerate(ANALYSIS_TAGS) if tag in tags)
+
+
+# A chunk's sentences come back as one byte each: the tag mask without the quote parity of
+# the text before the chunk, and in the top two bits the (double, single) quote parity of
+# the chunk up to the sentence. These tables turn them into final masks, one table per
+# parity at the start of the chunk.
+_QUOTE_MASK = 1 << ANALYSIS_TAGS.index('quote')
+_PARITY_TABLES = [bytes((code & 0x3f) | (_QUOTE_MASK if (code >> 6) ^ parity else 0) for code in range(256))
+                  for parity in range(4)]
+
+
+def _analyze_chunk(offset: int, chunk: str) -> tuple:
+    """Analyze one chunk of analyze_parallel in a worker.
+
+    Returns (ends, codes, first, last, parity): the sentence ends shifted by `offset`,
+    one code per sentence (see _PARITY_TABLES), (separator, text) of the first sentence
+    if it would merge into a sentence before the chunk, the text of the last sentence,
+    and the quote parity of the whole chunk.
+    """
+    index = index_sentences(chunk)
+    t = index.text
+    codes = bytearray()
+    pos = dq = sq = 0
+    for k in range(len(index)):
+        start = index.starts[k]
+        dq ^= t.count('"', pos, start) & 1
+        sq ^= t.count("'", pos, start) & 1
+        pos = start
+        codes.append(_tags_mask(sentence_tags(index.sentence_text(k), False)) | dq << 6 | sq << 7)
+    ends = array('q', (end + offset for end in index.ends))
+    first = last = None
+    if len(index):
+        sep = _merge_separator(t, index.piece_starts[0], index.piece_ends[0])
+        if sep is not None:
+            first = (sep, index.sentence_text(0))
+        last = index.sentence_text(len(index) - 1)
+    parity = (t.count('"') & 1) | (t.count("'") & 1) << 1
+    return ends, bytes(codes), first, last, parity
+
+
+def _paragraph_chunks(t: str, size: int):
+    """Cut `t` into pieces of about `size` characters, each ending after a blank line (or at the end).
+
+    Blank lines where _is_paragraph_cut does not allow a cut are passed over.
+    """
+    pos = 0
+    while pos < len(t):
+        cut = t.find('\n\n', pos + size)
+        while cut >= 0 and not _is_paragraph_cut(t, cut):
+            cut = t.find('\n\n', cut + 1)
+        end = len(t) if cut < 0 else cut + 2
+        yield pos, t[pos:end]
+        pos = end
+
+
+def analyze_parallel(text: str, workers=None, chunk_chars=None) -> DocumentAnalysis:
+    """DocumentAnalysis.of computed by `workers` processes, with the same result.
+
+    The text is cut after blank lines, where sentences only continue when a
+    bullet/dialog line is merged into the previous one, into chunks of `chunk_chars`
+    (by default enough for PARALLEL_CHUNKS_PER_WORKER per worker). Each chunk is
+    analyzed as if no quote were open before it; stitching the chunks back together
+    applies the quote parity carried over from the chunks before, re-tags sentences
+    merged across a cut, and is linear in the number of sentences.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    t = text.replace('\r\n', '\n').replace('\r', '\n')
+    workers = workers or os.cpu_count() or 1
+    if chunk_chars is None:
+        chunk_chars = max(PARALLEL_CHUNK_MIN_CHARS, len(t) // (workers * PARALLEL_CHUNKS_PER_WORKER))
+    offsets, chunks = [], []
+    for offset, chunk in _paragraph_chunks(t, chunk_chars):
+        offsets.append(offset)
+        chunks.append(chunk)
+    # spawn, not fork: the GUI calls this from a worker thread while Tk runs in another
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks) or 1),
+                             mp_context=multiprocessing.get_context('spawn')) as pool:
+        results = pool.map(_analyze_chunk, offsets, chunks)
+        ends = array('q')
+        masks = bytearray()
+        parity = 0  # quote parity before the chunk: double | single << 1
+        last_text = last_in_quotes = None
+        for chunk_ends, codes, first, last, chunk_parity in results:
+            if chunk_ends:
+                skip = 0
+                if first is not None and last_text is not None:
+                    # the chunk's first sentence continues the last one before the cut
+                    sep, first_text = first
+                    last_text = last_text + sep + first_text
+                    ends[-1] = chunk_ends[0]
+                    masks[-1] = _tags_mask(sentence_tags(last_text, last_in_quotes))
+                    skip = 1
+                ends.extend(chunk_ends[skip:])
+                masks += codes[skip:].translate(_PARITY_TABLES[parity])
+                if len(chunk_ends) > skip:
+                    last_text = last
+                    last_in_quotes = bool((codes[-1] >> 6) ^ parity)
+            parity ^= chunk_parity
+    return DocumentAnalysis(ends, array('B', masks))
+
+
+class AnalysisCache:
+    """Content-addressed cache of DocumentAnalysis: an in-memory LRU, backed by files in `directory`.
+
+    Keyed by a hash of the text and ANALYSIS_VERSION, so a document seen before (in
+    this session or, with a directory, an earlier one) is never analyzed again,
+    whatever the settings. Safe to use from the Tk and typing threads at once.
+    Misses are analyzed with DocumentAnalysis.of and `workers` processes.
+    """
+
+    def __init__(self, directory=None, memory_entries=ANALYSIS_MEMORY_ENTRIES, disk_entries=ANALYSIS_DISK_ENTRIES,
+                 workers=None):
+        self.directory = directory
+        self.workers = workers
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str) -> str:
+        digest = hashlib.sha1(f"{ANALYSIS_VERSION}:".encode('ascii'))
+        digest.update(text.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.bin')
+
+    def _remember(self, key: str, analysis: DocumentAnalysis):
+        with self._lock:
+            self._memory[key] = analysis
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def peek(self, text: str, key=None):
+        """The cached analysis of `text` from memory or disk, or None; never analyzes."""
+        key = key or self.key(text)
+        with self._lock:
+            analysis = self._memory.get(key)
+            if analysis is not None:
+                self._memory.move_to_end(key)
+                return analysis
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                analysis = DocumentAnalysis.from_bytes(f.read())
+            # the file's mtime is its place in the disk LRU
+            os.utime(path)
+        except OSError:
+            return None
+        if analysis is not None:
+            self._remember(key, analysis)
+        return analysis
+
+    def get(self, text: str) -> DocumentAnalysis:
+        """The analysis of `text`, analyzing it (and storing the result) on a miss."""
+        key = self.key(text)
+        analysis = self.peek(text, key)
+        if analysis is None:
+            analysis = DocumentAnalysis.of(text, self.workers)
+            self._remember(key, analysis)
+            if self.directory is not None:
+                self._store(key, analysis)
+        return analysis
+
+    def _store(self, key: str, analysis: DocumentAnalysis):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            atomic_write_bytes(self._path(key), analysis.to_bytes())
+            files = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                     if name.endswith('.bin')]
+            if len(files) > self.disk_entries:
+                files.sort(key=os.path.getmtime)
+                for path in files[:len(files) - self.disk_entries]:
+                    os.remove(path)
+        except OSError:
+            pass
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+
+
+# Used by build_multiplier_map and estimate_typing_seconds; memory only until a directory is set
+analysis_cache = AnalysisCache()
+
+
+def iter_paragraph_blocks(chunks):
+    """Regroup a stream of text chunks into blocks that each end after a blank line.
+
+    Cuts after every blank line that _is_paragraph_cut allows, as IncrementalAnalyzer
+    does, so the blocks analyzed one by one give the sentences of the whole text; the
+    last block holds whatever follows the final cut.
+    """
+    buf = ''
+    for chunk in chunks:
+        buf += chunk
+        pos = search = 0
+        while True:
+            cut = buf.find('\n\n', search)
+            # a blank line at the end of the buffer waits for the character after it
+            if cut < 0 or cut + 2 == len(buf):
+                break
+            if not _is_paragraph_cut(buf, cut):
+                search = cut + 1
+                continue
+            yield buf[pos:cut + 2]
+            pos = search = cut + 2
+        buf = buf[pos:]
+    if buf:
+        yield buf
+
+
+def iter_block_multipliers(blocks, settings):
+    """Yield (block, multipliers) for each block, as build_multiplier_map would for the joined text.
+
+    Blocks come from iter_paragraph_blocks. Quote parity is carried across blocks, and
+    a bullet/dialog line at the start of a block is merged into the previous sentence,
+    so a block is only yielded once the next block containing a sentence has been seen.
+    """
+    pending = []  # blocks waiting for the next sentence to arrive
+    last_multipliers = last_end = None  # where the pause of the last sentence seen was stored
+    last_text = last_in_quotes = None
+    dq = sq = 0
+    for block in blocks:
+        index = index_sentences(block)
+        multipliers = {}
+        if len(index):
+            in_quotes = list(iter_in_quotes(index, block, dq, sq))
+            first = 0
+            if last_text is not None:
+                sep = _merge_separator(index.text, index.piece_starts[0], index.piece_ends[0])
+                if sep is not None:
+                    # the first sentence continues the last one of an earlier block
+                    del last_multipliers[last_end]
+                    last_text = last_text + sep + index.sentence_text(0)
+                    last_end = index.ends[0] - 1
+                    multipliers[last_end] = sentence_multiplier(sentence_tags(last_text, last_in_quotes), settings)
+                    first = 1
+            for k in range(first, len(index)):
+                s_end, s = index.ends[k], index.sentence_text(k)
+                multipliers[s_end - 1] = sentence_multiplier(sentence_tags(s, in_quotes[k]), settings)
+                last_text, last_in_quotes, last_end = s, in_quotes[k], s_end - 1
+            last_multipliers = multipliers
+            yield from pending
+            pending = []
+        pending.append((block, multipliers))
+        dq ^= block.count('"') & 1
+        sq ^= block.count("'") & 1
+    yield from pending
+
+
+# Keystroke plan actions
+ACTION_KEY = 0        # type the intended character
+ACTION_TYPO = 1       # type a wrong (nearby) character
+ACTION_BACKSPACE = 2  # erase the previous typo
+ACTION_PAUSE = 3      # thinking pause, nothing is emitted
+ACTION_BURST = 4      # only while executing in burst mode: a run of keys sent in one write_burst()
+ACTION_PASTE = 5      # only while executing: a run of keys the backend cannot type, pasted at once
+
+_BACKSPACE = 8
+
+
+class KeystrokePlan:
+    """Compact, array-backed timeline of (action, key, delay) entries.
+
+    Keys are stored as code points (0 for pauses) and each delay is the time in
+    seconds to wait after the entry before moving on to the next one.
+    """
+    __slots__ = ('actions', 'keys', 'delays')
+
+    def __init__(self):
+        self.actions = array('B')
+        self.keys = array('I')
+        self.delays = array('d')
+
+    def append(self, action: int, key: str, delay: float):
+        self.actions.append(action)
+        self.keys.append(ord(key) if key else 0)
+        self.delays.append(delay)
+
+    def __len__(self):
+        return len(self.actions)
+
+    def __iter__(self):
+        for action, key, delay in zip(self.actions, self.keys, self.delays):
+            yield action, (chr(key) if key else ''), delay
+
+    @property
+    def char_count(self) -> int:
+        """Number of intended characters the plan types."""
+        return self.actions.count(ACTION_KEY)
+
+    def index_after(self, chars: int) -> int:
+        """Index of the entry following the `chars`-th intended character (0 for none)."""
+        if chars <= 0:
+            return 0
+        actions = self.actions
+        pos = -1
+        for _ in range(chars):
+            pos = actions.index(ACTION_KEY, pos + 1)
+        return pos + 1
+
+    def total_seconds(self) -> float:
+        """Total time the plan takes when replayed without overhead."""
+        return math.fsum(self.delays)
+
+
+numpy = None
+
+
+def _load_numpy():
+    """Import numpy the first time a PlanRandom asks for it; None if it is not installed."""
+    global numpy
+    if numpy is None:
+        try:
+            import numpy as module
+        except ImportError:
+            return None
+        numpy = module
+    return numpy
+
+
+# Uniform draws compile_plan takes per character: jitter, typo roll, thinking-pause roll, typo key
+DRAWS_PER_CHAR = 4
+# Characters whose draws compile_plan asks the random source for at once
+DRAW_BATCH_CHARS = 8192
+
+
+class PlanRandom:
+    """Dedicated, seedable random source for compile_plan, drawn in batches.
+
+    compile_plan takes DRAWS_PER_CHAR values per character whether or not they are
+    used, so the values a character gets depend only on the seed and its position:
+    a text compiled whole or sentence by sentence, with any settings, gives the same
+    draws. backend='numpy' (or 'auto' when numpy is installed) fills batches with
+    numpy's PCG64 generator; 'python' uses random.Random. The two give different
+    streams, so reproducing a run takes the same seed and backend.
+    """
+
+    def __init__(self, seed=None, backend='auto'):
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+        np = _load_numpy() if backend in ('auto', 'numpy') else None
+        if np is not None:
+            self.backend = 'numpy'
+            self._generator = np.random.Generator(np.random.PCG64(seed))
+        else:
+            self.backend = 'python'
+            self._generator = random.Random(seed)
+
+    def uniforms(self, n: int) -> list:
+        """Return the next `n` floats in [0, 1)."""
+        if self.backend == 'numpy':
+            return self._generator.random(n).tolist()
+        draw = self._generator.random
+        return [draw() for _ in range(n)]
+
+
+# Typo model: chance per character, and the extra time a typo costs in base delays
+# (wrong key held for 2 delays, backspace for half a delay)
+TYPO_CHANCE = 0.05
+TYPO_COST = 2.5
+
+
+def paragraph_break_ends(text: str) -> set:
+    """Indexes of the second newline of each blank-line paragraph break (non-overlapping, like str.count)."""
+    return {m.end() - 1 for m in re.finditer('\n\n', text)}
+
+
+def _iter_draws(rng, count: int):
+    """Yield exactly `count` uniforms from `rng`, DRAW_BATCH_CHARS characters' worth at a time.
+
+    The stream is the same as one batch of `count`, without holding it all in memory.
+    """
+    uniforms = getattr(rng, 'uniforms', None)
+    if uniforms is None:
+        draw = rng.random
+
+        def uniforms(n):
+            return [draw() for _ in range(n)]
+    batch = DRAWS_PER_CHAR * DRAW_BATCH_CHARS
+    for start in range(0, count, batch):
+        yield from uniforms(min(batch, count - start))
+
+
+def compile_plan(text: str, settings, rng=random, multipliers=None) -> KeystrokePlan:
+    """Turn `text` and a settings mapping into a KeystrokePlan.
+
+    `settings` uses the same keys as config.json. All randomness (jitter, typos and
+    thinking pauses) is drawn here so that executing the plan only has to wait and emit.
+    `rng` is a PlanRandom (values drawn in batches of DRAW_BATCH_CHARS characters) or
+    anything with a random() method, such as the random module. The expected duration of the plan
+    is what EtaTable and estimate_typing_seconds report.
+    """
+    base_delay = delay_per_char(settings['typing_speed_wpm'])
+    thinking = bool(settings['enable_thinking'])
+    mid_chance = float(settings['mid_sentence_pause_chance'])
+    mid_seconds = float(settings['mid_sentence_pause_seconds'])
+    sentence_pause = float(settings['sentence_pause_seconds'])
+    paragraph_pause = float(settings['paragraph_pause_seconds'])
+    if thinking and multipliers is None:
+        multipliers = build_multiplier_map(text, settings)
+    paragraph_ends = paragraph_break_ends(text) if thinking else ()
+
+    pick_typo = get_layout(settings.get('keyboard_layout', DEFAULT_LAYOUT)).pick
+
+    draws = _iter_draws(rng, DRAWS_PER_CHAR * len(text))
+
+    plan = KeystrokePlan()
+    for i, (char, jitter, typo_roll, pause_roll, typo_key) in enumerate(zip(text, draws, draws, draws, draws)):
+        # Base delay plus a slight human-like random variation (0.8x to 1.2x)
+        delay = base_delay * (0.8 + 0.4 * jitter)
+
+        # --- Mistake Simulation (e.g., 5% chance of a typo) ---
+        if typo_roll < TYPO_CHANCE:
+            # pick a nearby key on the keyboard layout in use (see layouts.py)
+            wrong_char = pick_typo(char, typo_key)
+            plan.append(ACTION_TYPO, wrong_char, base_delay * 2) # Longer pause for the mistake
+            plan.append(ACTION_BACKSPACE, chr(_BACKSPACE), base_delay * 0.5) # Short delay for backspace press
+
+        # --- Thinking pauses ---
+        # mid-word/word pause
+        if thinking and pause_roll < mid_chance and not char.isspace():
+            plan.append(ACTION_PAUSE, '', mid_seconds)
+
+        # --- Type the correct character ---
+        plan.append(ACTION_KEY, char, delay)
+
+        if thinking:
+            # longer pause after each sentence, scaled by its structure
+            if i in multipliers:
+                plan.append(ACTION_PAUSE, '', sentence_pause * multipliers[i])
+            # major pause between paragraphs
+            if i in paragraph_ends:
+                plan.append(ACTION_PAUSE, '', paragraph_pause)
+    return plan
+
+
+def _expected_costs(settings):
+    """Expected seconds per character, per non-space mid-word pause, per sentence and per paragraph."""
+    base = delay_per_char(settings['typing_speed_wpm'])
+    per_char = base + TYPO_CHANCE * TYPO_COST * base
+    if not settings['enable_thinking']:
+        return per_char, 0.0, 0.0, 0.0
+    mid = float(settings['mid_sentence_pause_chance']) * float(settings['mid_sentence_pause_seconds'])
+    return per_char, mid, float(settings['sentence_pause_seconds']), float(settings['paragraph_pause_seconds'])
+
+
+def estimate_typing_seconds(text: str, settings, tag_counts=None) -> float:
+    """Expected time compile_plan's plan for `text` takes, in closed form.
+
+    `tag_counts` is a Counter of sentence tags (see IncrementalAnalyzer.tag_counts);
+    it comes from analysis_cache when not given.
+    """
+    if settings['enable_thinking'] and tag_counts is None:
+        tag_counts = analysis_cache.get(text).tag_counts()
+    return estimate_seconds_from_counts(text_counts(text), settings, tag_counts)
+
+
+def text_counts(text: str) -> tuple:
+    """(characters, non-space characters, paragraph breaks) of `text`: all the ETA needs besides tags."""
+    # str.split() uses the same notion of whitespace as str.isspace()
+    return len(text), len(''.join(text.split())), text.count('\n\n')
+
+
+def estimate_seconds_from_counts(counts: tuple, settings, tag_counts=None) -> float:
+    """estimate_typing_seconds from text_counts() and tag counts, for a text no longer in memory."""
+    chars, non_space, paragraphs = counts
+    per_char, mid, sentence_pause, paragraph_pause = _expected_costs(settings)
+    total = chars * per_char
+    if settings['enable_thinking']:
+        total += non_space * mid
+        total += sum(count * sentence_pause * sentence_multiplier(tags, settings)
+                     for tags, count in (tag_counts or {}).items())
+        total += paragraphs * paragraph_pause
+    return total
+
+
+class EtaTable:
+    """Cumulative expected typing time per character of a run.
+
+    Built once with the same model as compile_plan, so the remaining time from any
+    index is a single lookup.
+    """
+    __slots__ = ('cumulative',)
+
+    def __init__(self, text: str, settings, multipliers=None):
+        per_char, mid, sentence_pause, paragraph_pause = _expected_costs(settings)
+        costs = array('d', [per_char]) * len(text)
+        if settings['enable_thinking']:
+            if multipliers is None:
+                multipliers = build_multiplier_map(text, settings)
+            if mid:
+                for i, char in enumerate(text):
+                    if not char.isspace():
+                        costs[i] += mid
+            for i, mult in multipliers.items():
+                costs[i] += sentence_pause * mult
+            for i in paragraph_break_ends(text):
+                costs[i] += paragraph_pause
+        cumulative = array('d', [0.0]) * (len(text) + 1)
+        running = 0.0
+        for i, cost in enumerate(costs, 1):
+            running += cost
+            cumulative[i] = running
+        self.cumulative = cumulative
+
+    def remaining(self, idx: int) -> float:
+        """Expected seconds left after the first `idx` characters have been typed."""
+        cumulative = self.cumulative
+        idx = min(max(idx, 0), len(cumulative) - 1)
+        return cumulative[-1] - cumulative[idx]
+
+
+class LatestBuilder:
+    """Runs builds handed off by a thread that must stay on time, on a helper thread.
+
+    request() returns at once; builds run one at a time, and a build still waiting when
+    a newer one is requested is dropped, so only the latest is ever built. `result`
+    holds the value of the last build that finished (None until then).
+    """
+
+    def __init__(self):
+        self.result = None
+        self._pending = None
+        self._running = False
+        self._lock = threading.Lock()
+
+    def request(self, build):
+        """Have `build()` run on the helper thread, replacing any build not started yet."""
+        with self._lock:
+            self._pending = build
+            if self._running:
+                return
+            self._running = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                build, self._pending = self._pending, None
+                if build is None:
+                    self._running = False
+                    return
+            try:
+                self.result = build()
+            except Exception:
+                pass
+
+
+class TypingCancelled(Exception):
+    """Raised out of execute_plan when its run is cancelled through a RunControl."""
+
+
+class RunControl:
+    """Pause/resume/cancel switch shared by the UI and a typing run.
+
+    The UI thread calls pause(), resume() and cancel(); the scheduler waits on the
+    same condition, so a request wakes it at once, even in the middle of a long pause.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.paused = False
+        self.cancelled = False
+
+    def pause(self):
+        with self._cond:
+            self.paused = True
+            self._cond.notify_all()
+
+    def resume(self):
+        with self._cond:
+            self.paused = False
+            self._cond.notify_all()
+
+    def cancel(self):
+        with self._cond:
+            self.cancelled = True
+            self._cond.notify_all()
+
+    def sleep(self, seconds: float) -> bool:
+        """Sleep up to `seconds`; returns True early if a pause or cancel is requested."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.paused or self.cancelled, seconds)
+
+    def hold(self) -> bool:
+        """Block while paused. Returns True if it had to wait; raises TypingCancelled once cancelled."""
+        with self._cond:
+            waited = self.paused and not self.cancelled
+            self._cond.wait_for(lambda: not self.paused or self.cancelled)
+            if self.cancelled:
+                raise TypingCancelled()
+            return waited
+
+
+class DeadlineScheduler:
+    """Wait for absolute deadlines on a monotonic clock instead of chaining sleeps.
+
+    Time spent emitting keys or updating the UI is absorbed by the next wait, so the
+    achieved rate matches the intended one. If the run falls behind, waits are skipped
+    until it has caught up; a lag larger than `max_lag` (e.g. after the machine was
+    suspended) rebases the timeline instead of bursting through the backlog.
+
+    With a RunControl, waits can be interrupted: time spent paused is shifted out of
+    the timeline, and cancelling raises TypingCancelled from wait().
+    """
+
+    def __init__(self, clock=time.perf_counter, sleep=time.sleep, spin=0.002, max_lag=1.0, control=None):
+        self.clock = clock
+        self.sleep = sleep
+        self.spin = spin  # final stretch of each wait is spent yielding instead of sleeping
+        self.max_lag = max_lag
+        self.control = control
+        self.start()
+
+    def start(self):
+        """Reset the timeline so the first deadline is now."""
+        self.origin = self.clock()
+        self.deadline = self.origin
+        self.intended = 0.0
+        self.rebased = 0.0
+        self.paused = 0.0
+        self.max_late = 0.0
+        self.late_count = 0
+
+    def advance(self, delay: float):
+        """Move the next deadline `delay` seconds further along the timeline."""
+        self.deadline += delay
+        self.intended += delay
+
+    def _hold(self):
+        """Block while the run is paused and push the timeline back by the time lost."""
+        started = self.clock()
+        if self.control.hold():
+            paused_for = self.clock() - started
+            self.deadline += paused_for
+            self.paused += paused_for
+
+    def wait(self):
+        """Block until the current deadline (coarse sleep, then a short fine-grained wait)."""
+        clock = self.clock
+        control = self.control
+        if control is not None:
+            self._hold()
+        remaining = self.deadline - clock()
+        if remaining <= 0:
+            late = -remaining
+            if late > self.max_late:
+                self.max_late = late
+            self.late_count += 1
+            if late > self.max_lag:
+                # too far behind to catch up believably; start over from now
+                self.deadline += late
+                self.rebased += late
+            return
+        if remaining > self.spin:
+            if control is None:
+                self.sleep(remaining - self.spin)
+            else:
+                while control.sleep(self.deadline - self.spin - clock()):
+                    self._hold()
+        while clock() < self.deadline:
+            self.sleep(0)
+
+    def report(self) -> dict:
+        """Measured timing of the run so far (positive drift means slower than intended).
+
+        Time spent paused is reported separately and not counted as drift.
+        """
+        actual = self.clock() - self.origin - self.paused
+        return {
+            'intended_seconds': self.intended,
+            'actual_seconds': actual,
+            'drift_seconds': actual - self.intended,
+            'max_late_seconds': self.max_late,
+            'late_count': self.late_count,
+            'rebased_seconds': self.rebased,
+            'paused_seconds': self.paused,
+        }
+
+
+# Longest stretch of typing (in seconds of inter-key delays) sent as one burst, which
+# also bounds how long a pause or cancel request waits in burst mode
+BURST_MAX_SECONDS = 0.2
+
+
+def _runs(entries, join):
+    """Group plan entries into runs: yields (True, run) for each run and (False, entry) for the rest.
+
+    join(entry, run) tells whether `entry` can be added to `run`, the list of
+    entries collected so far (empty when no run is open).
+    """
+    run = []
+    for item in entries:
+        if run and join(item, run):
+            run.append(item)
+            continue
+        if run:
+            yield True, run
+        if join(item, []):
+            run = [item]
+        else:
+            run = []
+            yield False, item
+    if run:
+        yield True, run
+
+
+def _paste_entries(entries, untypeable):
+    """Plan entries with each run of keys in `untypeable` merged into (ACTION_PASTE, text, delay).
+
+    `delay` is the sum of the run's delays, so the timeline is the same as typing
+    the characters one by one.
+    """
+    def join(item, run):
+        return item[0] == ACTION_KEY and chr(item[1]) in untypeable
+
+    for is_run, item in _runs(entries, join):
+        if is_run:
+            yield ACTION_PASTE, ''.join(chr(k) for _, k, _ in item), math.fsum(d for _, _, d in item)
+        else:
+            yield item
+
+
+def _burst_entries(entries, max_seconds=BURST_MAX_SECONDS):
+    """Plan entries with runs of consecutive keys merged into (ACTION_BURST, (text, intervals), delay).
+
+    Typos, backspaces, pauses and pastes stay single entries, so a run ends at each
+    of them. `intervals` are the delays between the run's keys and `delay` is the
+    whole run's, so the timeline is the same as typing the keys one by one.
+    """
+    spent = 0.0  # delay of the open run
+
+    def join(item, run):
+        nonlocal spent
+        if item[0] != ACTION_KEY:
+            return False
+        total = (spent if run else 0.0) + item[2]
+        if total > max_seconds:
+            return False
+        spent = total
+        return True
+
+    for is_run, item in _runs(entries, join):
+        if not is_run:
+            yield item
+        elif len(item) == 1:
+            yield item[0]
+        else:
+            delays = [d for _, _, d in item]
+            yield ACTION_BURST, (''.join(chr(k) for _, k, _ in item), delays[:-1]), math.fsum(delays)
+
+
+def execute_plan(plan: KeystrokePlan, backend, on_char=None, scheduler=None, restart=True, skip_chars=0,
+                 trace=None, burst=False, log=None):
+    """Replay a KeystrokePlan: wait until each entry's deadline, then emit it through `backend`.
+
+    `backend` is an output backend (see backends.py) with write() and press().
+    `on_char` (if given) is called with the number of intended characters typed so far.
+    Pass restart=False to continue the scheduler's current timeline, e.g. when a
+    document is typed plan by plan as it streams in. `skip_chars` resumes a run whose
+    first characters were already typed; counts passed to `on_char` include them.
+
+    If the scheduler's run is cancelled between a typo and its backspace, the typo is
+    erased before TypingCancelled propagates. `trace` is an optional
+    instrument.RunTrace that records the timing of every entry, and `log` an
+    eventlog.EventLog that records every emitted entry so the run can be replayed.
+
+    With `burst`, runs of keys without a typo or pause between them are handed to
+    backend.write_burst() with their inter-key delays, one call per run instead of a
+    wait and a write per key; at high WPM the per-key overhead otherwise caps the rate.
+
+    Characters the backend cannot type (backend.can_type) are sent with
+    backend.paste(), a run of them at once, taking the time typing them would.
+    """
+    if scheduler is None:
+        scheduler = DeadlineScheduler()
+    if restart:
+        scheduler.start()
+    wait = scheduler.wait
+    advance = scheduler.advance
+    write = backend.write
+    press = backend.press
+    write_burst = backend.write_burst
+    paste = backend.paste
+    entry = None
+    if trace is not None:
+        wait, write, press, write_burst, paste, on_char = trace.instrument(scheduler, backend, on_char)
+        entry = trace.entry
+    typed = skip_chars
+    actions, keys, delays = plan.actions, plan.keys, plan.delays
+    start = plan.index_after(skip_chars)
+    if start:
+        actions, keys, delays = actions[start:], keys[start:], delays[start:]
+    entries = zip(actions, keys, delays)
+    # checked once per distinct character, so plans the backend can type fully pay nothing
+    untypeable = {c for c in map(chr, set(keys)) if not backend.can_type(c)}
+    if untypeable:
+        entries = _paste_entries(entries, untypeable)
+    if burst:
+        entries = _burst_entries(entries)
+    last = None  # last entry emitted
+    try:
+        for action, key, delay in entries:
+            wait()
+            if log is not None:
+                log.record(action, key, scheduler)
+            if action == ACTION_KEY:
+                write(chr(key))
+                typed += 1
+                if on_char is not None:
+                    on_char(typed)
+            elif action == ACTION_TYPO:
+                # a wrong character with no key still has to appear, or the backspace eats a real one
+                (paste if chr(key) in untypeable else write)(chr(key))
+            elif action == ACTION_BACKSPACE:
+                press('backspace')
+            elif action == ACTION_BURST:
+                text, intervals = key
+                write_burst(text, intervals)
+                typed += len(text)
+                if on_char is not None:
+                    on_char(typed)
+            elif action == ACTION_PASTE:
+                paste(key)
+                typed += len(key)
+                if on_char is not None:
+                    on_char(typed)
+            advance(delay)
+            last = action
+            if entry is not None:
+                entry(action)
+        # honour the delay after the last entry so the run length matches the plan
+        wait()
+        if log is not None:
+            log.record(ACTION_PAUSE, 0, scheduler)
+    except TypingCancelled:
+        if last == ACTION_TYPO:
+            if log is not None:
+                log.record(ACTION_BACKSPACE, _BACKSPACE, scheduler)
+            press('backspace')
+        raise
+    return typed
+
+
+def _sentence_segments(text: str, ends):
+    """Yield (start, end) spans of `text` that each end at one of the sentence `ends`.
+
+    Spans cover the whole text. A boundary that would split a blank-line paragraph
+    break is dropped, so every paragraph pause stays inside one span.
+    """
+    start = 0
+    for end in ends:
+        if end <= start or end >= len(text) or (text[end - 1] == '\n' and text[end] == '\n'):
+            continue
+        yield start, end
+        start = end
+    if start < len(text):
+        yield start, len(text)
+
+
+def type_text(text: str, live, backend, rng=random, on_char=None, scheduler=None, skip_chars=0, trace=None,
+              on_settings=None, log=None):
+    """Compile and type `text` sentence by sentence, following live settings changes.
+
+    `live` is a LiveSettings; before each sentence its current snapshot is compared
+    with the one in use, and on a change the sentence multipliers are rebuilt and the
+    rest of the text is typed with the new settings. The random stream does not
+    depend on where the text is cut, so with unchanged settings the keystrokes are
+    the same as compile_plan's for the whole text. `on_settings(snapshot, multipliers)`
+    is called when typing starts and after every change (e.g. to refresh an ETA).
+    `trace` and `log` are passed on to execute_plan. Returns the number of intended characters typed, including `skip_chars`.
+    """
+    if scheduler is None:
+        scheduler = DeadlineScheduler()
+    # sentence ends and tags come from analysis_cache: a document analyzed before is not split again
+    analysis = analysis_cache.get(text)
+    scheduler.start()
+    settings = multipliers = positions = None
+    typed = skip_chars
+    for start, end in _sentence_segments(text, analysis.ends):
+        if live.current is not settings:
+            settings = live.current
+            multipliers = analysis.multipliers(settings) if settings.enable_thinking else {}
+            positions = sorted(multipliers)
+            if on_settings is not None:
+                on_settings(settings, multipliers)
+        lo = bisect.bisect_left(positions, start)
+        hi = bisect.bisect_left(positions, end, lo)
+        segment = {i - start: multipliers[i] for i in positions[lo:hi]}
+        plan = compile_plan(text[start:end], settings, rng=rng, multipliers=segment)
+        if end <= skip_chars:
+            # typed by an earlier run; compiled only to keep the random stream in step
+            continue
+        # execute_plan counts from the start of the segment; report positions in the whole text
+        segment_on_char = None if on_char is None else (lambda n, base=start: on_char(base + n))
+        done = execute_plan(plan, backend, on_char=segment_on_char, scheduler=scheduler, restart=False,
+                            skip_chars=max(0, skip_chars - start), trace=trace, burst=settings.burst_mode,
+                            log=log)
+        typed = start + done
+    return typed
+
+
+# Timing settings used when config.json does not provide them (same keys as config.json)
+DEFAULT_SETTINGS = {
+    'typing_speed_wpm': 40,
+    'enable_thinking': True,
+    'mid_sentence_pause_chance': 0.05,
+    'mid_sentence_pause_seconds': 0.8,
+    'sentence_pause_seconds': 1.6,
+    'paragraph_pause_seconds': 20.0,
+    'quote_sentence_multiplier': 1.5,
+    'analysis_sentence_multiplier': 1.8,
+    'context_sentence_multiplier': 1.3,
+    'keyboard_layout': DEFAULT_LAYOUT,
+    # send runs of keys as one backend call (see execute_plan), for very high WPM
+    'burst_mode': False,
+}
+
+# Named presets; keys missing from a preset keep their current value
+PRESETS = {
+    'conservative': {
+        'typing_speed_wpm': 30,
+        'enable_thinking': True,
+        'mid_sentence_pause_chance': 0.02,
+        'mid_sentence_pause_seconds': 0.5,
+        'sentence_pause_seconds': 1.0,
+        'paragraph_pause_seconds': 45.0,
+    },
+    'normal': {
+        'typing_speed_wpm': 45,
+        'enable_thinking': True,
+        'mid_sentence_pause_chance': 0.05,
+        'mid_sentence_pause_seconds': 0.8,
+        'sentence_pause_seconds': 1.6,
+        'paragraph_pause_seconds': 20.0,
+        'quote_sentence_multiplier': 1.4,
+        'analysis_sentence_multiplier': 1.6,
+        'context_sentence_multiplier': 1.2,
+    },
+    'deep': {
+        'typing_speed_wpm': 35,
+        'enable_thinking': True,
+        'mid_sentence_pause_chance': 0.12,
+        'mid_sentence_pause_seconds': 1.6,
+        'sentence_pause_seconds': 3.0,
+        'paragraph_pause_seconds': 60.0,
+        'quote_sentence_multiplier': 1.6,
+        'analysis_sentence_multiplier': 2.0,
+        'context_sentence_multiplier': 1.4,
+    }
+    ,
+    'student': {
+        # Average student typist: moderate speed, moderate mistakes
+        'typing_speed_wpm': 38,
+        'enable_thinking': True,
+        'mid_sentence_pause_chance': 0.07,
+        'mid_sentence_pause_seconds': 0.9,
+        'sentence_pause_seconds': 1.8,
+        'paragraph_pause_seconds': 15.0,
+        'quote_sentence_multiplier': 1.3,
+        'analysis_sentence_multiplier': 1.5,
+        'context_sentence_multiplier': 1.2,
+    }
+}
+
+
+def preset_settings(name: str, base=None) -> dict:
+    """Return `base` (DEFAULT_SETTINGS by default) with preset `name` applied."""
+    settings = dict(DEFAULT_SETTINGS if base is None else base)
+    settings.update(PRESETS[name])
+    return settings
+
+
+class SettingsSnapshot(Mapping):
+    """Read-only copy of the timing settings, taken on the thread that owns them.
+
+    Fields are plain attributes (snapshot.typing_speed_wpm) and it is also a mapping
+    with config.json keys, so it can be passed anywhere a settings dict is accepted.
+    Keys missing from `settings` take their DEFAULT_SETTINGS value.
+    """
+    __slots__ = tuple(DEFAULT_SETTINGS)
+
+    def __init__(self, settings=None):
+        merged = dict(DEFAULT_SETTINGS)
+        if settings is not None:
+            merged.update((k, settings[k]) for k in DEFAULT_SETTINGS if k in settings)
+        for key, value in merged.items():
+            kind = type(DEFAULT_SETTINGS[key])
+            object.__setattr__(self, key, kind(value) if kind in (bool, str) else float(value))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("settings snapshots are read-only")
+
+    def __getitem__(self, key):
+        if key not in DEFAULT_SETTINGS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __repr__(self):
+        return f"SettingsSnapshot({dict(self)!r})"
+
+
+class LiveSettings:
+    """The current SettingsSnapshot of a run, replaced as a whole when a setting changes.
+
+    publish() can be called from any thread: swapping one attribute is atomic, so the
+    typing thread always sees either the old or the new snapshot, never a mix.
+    """
+
+    def __init__(self, settings=None):
+        self.current = SettingsSnapshot(settings)
+
+    def publish(self, settings):
+        self.current = SettingsSnapshot(settings)
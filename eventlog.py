@@ -0,0 +1,134 @@
+"""Binary event logs of typing runs, and their replay.
+
+A run's timeline is drawn live from the random stream and then gone; with an
+EventLog passed to execute_plan (log=...) every emitted entry is written to a
+file as a fixed-width record, so a run that misbehaved can be replayed exactly:
+
+    with EventLog('run.htlog') as log:
+        type_text(text, live, backend, scheduler=scheduler, log=log)
+    ...
+    replay('run.htlog', get_backend('xtest'))
+
+A log is a HEADER followed by RECORDs: (action, code point, seconds since the
+start of the run). Times are when the entry was emitted, with time spent paused
+left out, so replay reproduces the delays and lateness that actually happened.
+Keys sent in one burst or paste are logged one by one. Reading maps the file
+and decodes it in one pass without looking at the text; a log cut short by a
+crash is read up to its last whole record.
+"""
+import mmap
+import struct
+import time
+
+import core
+
+
+MAGIC = b'HTLOG\x00'
+VERSION = 1
+# magic, version, wall-clock time the run started (seconds since the epoch)
+HEADER = struct.Struct('<6sHd')
+# action, (padding), code point (0 for pauses), seconds since the start of the run
+RECORD = struct.Struct('<BxxxId')
+# Records buffered in memory before they are written out
+FLUSH_RECORDS = 4096
+
+
+class EventLog:
+    """Writes the entries of one run to `path`; see the module docstring."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, VERSION, time.time()))
+        self._buffer = bytearray()
+        self._pending = 0
+        self._scheduler = None
+        self._origin = 0.0
+
+    def record(self, action: int, key, scheduler):
+        """Log the entry execute_plan is about to emit, timed by `scheduler`'s clock."""
+        if scheduler is not self._scheduler:
+            # the first entry of the run is at time 0; a run made of several plans keeps one origin
+            self._scheduler = scheduler
+            self._origin = scheduler.clock() - scheduler.paused
+        now = scheduler.clock() - scheduler.paused - self._origin
+        pack = RECORD.pack
+        if action == core.ACTION_BURST:
+            text, intervals = key
+            for i, ch in enumerate(text):
+                self._buffer += pack(core.ACTION_KEY, ord(ch), now)
+                if i < len(intervals):
+                    now += intervals[i]
+            self._pending += len(text)
+        elif action == core.ACTION_PASTE:
+            for ch in key:
+                self._buffer += pack(core.ACTION_KEY, ord(ch), now)
+            self._pending += len(key)
+        else:
+            self._buffer += pack(action, key, now)
+            self._pending += 1
+        if self._pending >= FLUSH_RECORDS:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._file.flush()
+            self._buffer.clear()
+        self._pending = 0
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_log(path: str) -> tuple:
+    """Return (start time, records) of a log: records is a list of (action, key, seconds) tuples."""
+    with open(path, 'rb') as f:
+        size = f.seek(0, 2)
+        if size < HEADER.size:
+            raise ValueError(f"{path} is not a typing event log")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, version, started = HEADER.unpack_from(mm)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a typing event log")
+            if version != VERSION:
+                raise ValueError(f"{path} is a version {version} event log; this version reads {VERSION}")
+            end = size - (size - HEADER.size) % RECORD.size
+            view = memoryview(mm)[HEADER.size:end]
+            try:
+                records = list(RECORD.iter_unpack(view))
+            finally:
+                view.release()
+    return started, records
+
+
+def load_plan(path: str) -> core.KeystrokePlan:
+    """Rebuild the timeline of a log as a KeystrokePlan that execute_plan can run."""
+    _, records = read_log(path)
+    plan = core.KeystrokePlan()
+    if not records:
+        return plan
+    plan.actions.extend(action for action, _, _ in records)
+    plan.keys.extend(key for _, key, _ in records)
+    times = [t for _, _, t in records]
+    # each entry's delay runs until the next one was emitted; the last one ends the run
+    plan.delays.extend(max(0.0, b - a) for a, b in zip(times, times[1:]))
+    plan.delays.append(0.0)
+    return plan
+
+
+def replay(path: str, backend, on_char=None, scheduler=None, trace=None, log=None) -> int:
+    """Type the run logged at `path` again through `backend`, with the same keys and timing.
+
+    Returns the number of intended characters typed.
+    """
+    return core.execute_plan(load_plan(path), backend, on_char=on_char, scheduler=scheduler, trace=trace,
+                             log=log)
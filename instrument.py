@@ -0,0 +1,274 @@
+"""Opt-in timing instrumentation for typing runs.
+
+Pass a RunTrace to execute_plan (trace=...) to record, per plan entry, how long
+each phase took (waiting, thinking pauses, key emission, typo corrections,
+progress callbacks), the intended vs actual delay and how late the entry was.
+Samples go into fixed-size ring buffers, so a run of any length uses bounded
+memory; totals are kept separately and cover the whole run. Without a trace
+execute_plan runs its plain loop and pays nothing.
+
+    trace = RunTrace()
+    execute_plan(plan, backend, scheduler=scheduler, trace=trace)
+    write_report(trace.report(settings), 'timing_report.json')   # or .csv
+"""
+import csv
+import json
+import math
+from array import array
+
+import core
+
+
+# Upper bounds of the histogram buckets, in milliseconds (the last bucket is open-ended)
+HISTOGRAM_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Phase recorded for the wait before an entry, by the action of the entry the delay belongs to
+_WAIT_PHASES = {
+    core.ACTION_KEY: 'wait_key',
+    core.ACTION_TYPO: 'wait_typo',
+    core.ACTION_BACKSPACE: 'wait_backspace',
+    core.ACTION_PAUSE: 'thinking_pause',
+    core.ACTION_BURST: 'wait_burst',
+    core.ACTION_PASTE: 'wait_paste',
+}
+# Phase recorded for the backend call(s) of an entry
+_EMIT_PHASES = {
+    core.ACTION_KEY: 'emit_key',
+    core.ACTION_TYPO: 'emit_typo',
+    core.ACTION_BACKSPACE: 'emit_backspace',
+    core.ACTION_BURST: 'emit_burst',
+    core.ACTION_PASTE: 'emit_paste',
+}
+
+
+def percentiles(values, points=(50, 90, 99)) -> dict:
+    """Nearest-rank percentiles of `values` plus the maximum."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    out = {f"p{p}": ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] for p in points}
+    out['max'] = ordered[-1]
+    return out
+
+
+def histogram(values_ms) -> list:
+    """Counts of `values_ms` per HISTOGRAM_BUCKETS_MS bucket, as [upper_ms, count] pairs (None = open-ended)."""
+    counts = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+    for v in values_ms:
+        for i, upper in enumerate(HISTOGRAM_BUCKETS_MS):
+            if v <= upper:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+    return [[upper, n] for upper, n in zip(HISTOGRAM_BUCKETS_MS + (None,), counts)]
+
+
+class RingBuffer:
+    """Fixed-capacity array of numbers; once full, each append overwrites the oldest value."""
+    __slots__ = ('data', 'capacity', 'count')
+
+    def __init__(self, typecode: str = 'd', capacity: int = 65536):
+        self.data = array(typecode)
+        self.capacity = capacity
+        self.count = 0  # values appended in total, including overwritten ones
+
+    def append(self, value):
+        if self.count < self.capacity:
+            self.data.append(value)
+        else:
+            self.data[self.count % self.capacity] = value
+        self.count += 1
+
+    def __len__(self):
+        return len(self.data)
+
+    def values(self) -> list:
+        """Values still held, oldest first."""
+        split = self.count % self.capacity if self.count > self.capacity else 0
+        return self.data[split:].tolist() + self.data[:split].tolist()
+
+
+def _stats(seconds) -> dict:
+    ms = [s * 1e3 for s in seconds]
+    out = {'samples': len(ms), 'total_seconds': math.fsum(seconds)}
+    if ms:
+        out['mean_ms'] = math.fsum(ms) / len(ms)
+        out.update({f"{k}_ms": v for k, v in percentiles(ms).items()})
+    out['histogram_ms'] = histogram(ms)
+    return out
+
+
+class RunTrace:
+    """Per-entry timing of one run of execute_plan; see the module docstring.
+
+    Each phase has its own ring buffer, written by a single thread: the typing
+    thread records the plan phases, and a UI can record its own (e.g. 'tk_update')
+    with add_phase from its thread.
+    """
+
+    def __init__(self, capacity: int = 65536):
+        self.capacity = capacity
+        self.phases = {}
+        # per-entry samples: action, intended and actual time since the previous entry, lateness
+        self.actions = RingBuffer('B', capacity)
+        self.intended = RingBuffer('d', capacity)
+        self.actual = RingBuffer('d', capacity)
+        self.late = RingBuffer('d', capacity)
+        # whole-run totals, not limited by the ring size
+        self.chars = 0
+        self.intended_seconds = 0.0
+        self.actual_seconds = 0.0
+        self.pause_seconds = 0.0  # part of actual_seconds spent in thinking pauses
+        self._last_action = None
+        self._scheduler = self._state = None
+
+    def add_phase(self, name: str, seconds: float):
+        """Record one sample of phase `name`."""
+        ring = self.phases.get(name)
+        if ring is None:
+            ring = self.phases[name] = RingBuffer('d', self.capacity)
+        ring.append(seconds)
+
+    def instrument(self, scheduler, backend, on_char=None):
+        """Timed stand-ins for (scheduler.wait, backend.write, backend.press, backend.write_burst,
+        backend.paste, on_char).
+
+        Used by execute_plan.
+        """
+        clock = scheduler.clock
+        add_phase = self.add_phase
+        # handoff from the wrappers to entry(); only the typing thread touches it. Kept
+        # while the scheduler is the same, so a run made of several plans is one timeline
+        state = self._state
+        if scheduler is not self._scheduler:
+            state = {'wait': 0.0, 'late': 0.0, 'gap': 0.0, 'intended': 0.0, 'emit': 0.0, 'run_chars': 0,
+                     'last_time': None, 'last_intended': scheduler.intended, 'last_paused': scheduler.paused}
+            self._scheduler, self._state = scheduler, state
+
+        def wait():
+            deadline = scheduler.deadline
+            start = clock()
+            scheduler.wait()
+            now = clock()
+            state['wait'] = now - start
+            state['late'] = now - deadline
+            state['intended'] = scheduler.intended - state['last_intended']
+            # time the user spent paused is not part of the delay
+            paused = scheduler.paused - state['last_paused']
+            state['gap'] = 0.0 if state['last_time'] is None else now - state['last_time'] - paused
+            state['last_time'] = now
+            state['last_intended'] = scheduler.intended
+            state['last_paused'] = scheduler.paused
+
+        def write(text):
+            start = clock()
+            backend.write(text)
+            state['emit'] += clock() - start
+
+        def press(key):
+            start = clock()
+            backend.press(key)
+            state['emit'] += clock() - start
+
+        def write_burst(text, intervals):
+            start = clock()
+            backend.write_burst(text, intervals)
+            state['emit'] += clock() - start
+            state['run_chars'] = len(text)
+
+        def paste(text):
+            start = clock()
+            backend.paste(text)
+            state['emit'] += clock() - start
+            state['run_chars'] = len(text)
+
+        if on_char is None:
+            return wait, write, press, write_burst, paste, None
+
+        def timed_on_char(typed):
+            start = clock()
+            on_char(typed)
+            add_phase('progress', clock() - start)
+        return wait, write, press, write_burst, paste, timed_on_char
+
+    def entry(self, action: int):
+        """Record the entry execute_plan just emitted (after the instrumented wait and emit)."""
+        state = self._state
+        previous = self._last_action
+        if previous is not None:
+            # the wait before this entry is the delay that belongs to the previous one
+            self.add_phase(_WAIT_PHASES[previous], state['wait'])
+            self.actions.append(previous)
+            self.intended.append(state['intended'])
+            self.actual.append(state['gap'])
+            self.intended_seconds += state['intended']
+            self.actual_seconds += state['gap']
+            if previous == core.ACTION_PAUSE:
+                self.pause_seconds += state['gap']
+        self.late.append(state['late'])
+        emit = _EMIT_PHASES.get(action)
+        if emit is not None:
+            self.add_phase(emit, state['emit'])
+        state['emit'] = 0.0
+        if action == core.ACTION_KEY:
+            self.chars += 1
+        elif action in (core.ACTION_BURST, core.ACTION_PASTE):
+            self.chars += state['run_chars']
+        self._last_action = action
+
+    def report(self, settings=None) -> dict:
+        """Summary of the run: per-phase statistics and histograms, delay error and achieved WPM."""
+        intended = self.intended.values()
+        actual = self.actual.values()
+        errors = [a - i for a, i in zip(actual, intended)]
+        out = {
+            'entries': self.late.count,
+            'samples_kept': len(self.late),
+            'characters': self.chars,
+            'phases': {name: _stats(ring.values()) for name, ring in sorted(self.phases.items())},
+            'delays': {
+                'intended_seconds': self.intended_seconds,
+                'actual_seconds': self.actual_seconds,
+                'error': _stats([abs(e) for e in errors]),
+                'mean_error_ms': math.fsum(errors) / len(errors) * 1e3 if errors else None,
+            },
+            'lateness': _stats([max(0.0, x) for x in self.late.values()]),
+        }
+        # 5 characters per word, as in core.delay_per_char
+        wpm = {
+            'achieved': self.chars / 5 / (self.actual_seconds / 60) if self.actual_seconds else None,
+            'intended': self.chars / 5 / (self.intended_seconds / 60) if self.intended_seconds else None,
+        }
+        if settings is not None:
+            wpm['target'] = float(settings['typing_speed_wpm'])
+            # keying speed alone, without thinking pauses (which the target does not include)
+            keying = self.actual_seconds - self.pause_seconds
+            wpm['achieved_without_pauses'] = self.chars / 5 / (keying / 60) if keying else None
+        out['wpm'] = wpm
+        return out
+
+
+def _flatten(prefix, value, rows):
+    if isinstance(value, dict):
+        for key, sub in value.items():
+            _flatten(f"{prefix}.{key}" if prefix else key, sub, rows)
+    elif isinstance(value, list):
+        # histogram: one row per bucket
+        for upper, count in value:
+            rows.append((f"{prefix}.le_{upper if upper is not None else 'inf'}", count))
+    else:
+        rows.append((prefix, value))
+
+
+def write_report(report: dict, path: str):
+    """Write a report from RunTrace.report as JSON, or as metric,value CSV rows if `path` ends in .csv."""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        if path.lower().endswith('.csv'):
+            rows = []
+            _flatten('', report, rows)
+            writer = csv.writer(f)
+            writer.writerow(('metric', 'value'))
+            writer.writerows(rows)
+        else:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,217 @@
+"""Keyboard layouts for typo generation.
+
+Each layout is described by its four character rows (unshifted and shifted) and
+a horizontal offset per row, so keys get physical positions. compile_layout turns
+that into a flat lookup table: every typeable character owns TABLE_WIDTH slots
+filled with its neighbours in proportion to how likely each one is to be hit by
+mistake (closer keys more often, the other shift level of the same key rarely).
+Picking a typo is then one random number and one string index.
+
+Compiled tables are kept in memory and cached on disk (CACHE_PATH); the cache is
+rebuilt automatically when the layout definitions change.
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import unicodedata
+
+from storage import atomic_write_text
+
+
+# Slots per character in a compiled table; neighbour weights are quantized to 1/TABLE_WIDTH
+TABLE_WIDTH = 32
+# Relative weight of hitting the same key with the wrong shift state (e.g. 'a' for 'A')
+SHIFT_SLIP_WEIGHT = 0.15
+# Keys further apart than this (in key widths, centre to centre) are not neighbours
+NEIGHBOR_DISTANCE = 1.5
+
+# name -> rows of (unshifted, shifted) characters, top (number) row first, with the
+# x offset of each row's first key in key widths. ISO layouts have an extra key left
+# of the bottom row, so their bottom row starts further left.
+LAYOUTS = {
+    'qwerty': {
+        'rows': [
+            ("`1234567890-=", "~!@#$%^&*()_+"),
+            ("qwertyuiop[]\\", "QWERTYUIOP{}|"),
+            ("asdfghjkl;'", 'ASDFGHJKL:"'),
+            ("zxcvbnm,./", "ZXCVBNM<>?"),
+        ],
+        'offsets': (0.0, 1.5, 1.75, 2.25),
+    },
+    'azerty': {
+        'rows': [
+            ("²&é\"'(-è_çà)=", "²1234567890°+"),
+            ("azertyuiop^$", "AZERTYUIOP¨£"),
+            ("qsdfghjklmù*", "QSDFGHJKLM%µ"),
+            ("<wxcvbn,;:!", ">WXCVBN?./§"),
+        ],
+        'offsets': (0.0, 1.5, 1.75, 1.25),
+    },
+    'qwertz': {
+        'rows': [
+            ("^1234567890ß´", "°!\"§$%&/()=?`"),
+            ("qwertzuiopü+", "QWERTZUIOPÜ*"),
+            ("asdfghjklöä#", "ASDFGHJKLÖÄ'"),
+            ("<yxcvbnm,.-", ">YXCVBNM;:_"),
+        ],
+        'offsets': (0.0, 1.5, 1.75, 1.25),
+    },
+    'dvorak': {
+        'rows': [
+            ("`1234567890[]", "~!@#$%^&*(){}"),
+            ("',.pyfgcrl/=\\", '"<>PYFGCRL?+|'),
+            ("aoeuidhtns-", "AOEUIDHTNS_"),
+            (";qjkxbmwvz", ":QJKXBMWVZ"),
+        ],
+        'offsets': (0.0, 1.5, 1.75, 2.25),
+    },
+    'colemak': {
+        'rows': [
+            ("`1234567890-=", "~!@#$%^&*()_+"),
+            ("qwfpgjluy;[]\\", "QWFPGJLUY:{}|"),
+            ("arstdhneio'", 'ARSTDHNEIO"'),
+            ("zxcvbkm,./", "ZXCVBKM<>?"),
+        ],
+        'offsets': (0.0, 1.5, 1.75, 2.25),
+    },
+}
+
+DEFAULT_LAYOUT = 'qwerty'
+
+CACHE_PATH = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                          'humantyper', 'layouts.json')
+
+
+def _definitions_digest() -> str:
+    """Fingerprint of the layout definitions and table parameters, to invalidate the disk cache."""
+    source = json.dumps([LAYOUTS, TABLE_WIDTH, SHIFT_SLIP_WEIGHT, NEIGHBOR_DISTANCE], sort_keys=True)
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+
+def _quantize(weights: dict) -> str:
+    """Spread TABLE_WIDTH slots over the characters of `weights` (largest remainder), as one string."""
+    total = sum(weights.values())
+    shares = {ch: w / total * TABLE_WIDTH for ch, w in weights.items()}
+    counts = {ch: int(s) for ch, s in shares.items()}
+    left = TABLE_WIDTH - sum(counts.values())
+    for ch in sorted(shares, key=lambda c: counts[c] - shares[c])[:left]:
+        counts[ch] += 1
+    return ''.join(ch * n for ch, n in counts.items())
+
+
+def compile_layout(name: str) -> tuple:
+    """Build the (keys, table) strings of layout `name`: key i owns table[i*TABLE_WIDTH:(i+1)*TABLE_WIDTH]."""
+    spec = LAYOUTS[name]
+    # physical key positions: (x, y) -> (unshifted, shifted)
+    keys = []
+    for y, ((lower, upper), offset) in enumerate(zip(spec['rows'], spec['offsets'])):
+        for i, pair in enumerate(zip(lower, upper)):
+            keys.append((offset + i, y, pair))
+
+    order = []
+    table = []
+    seen = set()
+    for x, y, pair in keys:
+        near = []
+        for x2, y2, pair2 in keys:
+            d = math.hypot(x2 - x, y2 - y)
+            if 0 < d <= NEIGHBOR_DISTANCE:
+                near.append((pair2, 1.0 / (d * d)))
+        for level in (0, 1):
+            ch = pair[level]
+            if ch in seen:
+                continue
+            seen.add(ch)
+            weights = {}
+            for pair2, w in near:
+                weights[pair2[level]] = weights.get(pair2[level], 0.0) + w
+            if pair[1 - level] != ch:
+                weights[pair[1 - level]] = weights.get(pair[1 - level], 0.0) + SHIFT_SLIP_WEIGHT
+            order.append(ch)
+            table.append(_quantize(weights))
+
+    # space: the middle of the bottom row, or a doubled space; newline is retyped as is
+    bottom = spec['rows'][3][0]
+    mid = len(bottom) // 2
+    order.append(' ')
+    table.append(_quantize({ch: 1.0 for ch in bottom[mid - 2:mid + 1] + ' '}))
+    order.append('\n')
+    table.append('\n' * TABLE_WIDTH)
+    return ''.join(order), ''.join(table)
+
+
+class KeyboardLayout:
+    """A compiled layout: nearby() picks a typo for a character with one table lookup."""
+    __slots__ = ('name', 'keys', 'table', 'index', 'letters')
+
+    def __init__(self, name: str, keys: str, table: str):
+        self.name = name
+        self.keys = keys
+        self.table = table
+        self.index = {ch: i * TABLE_WIDTH for i, ch in enumerate(keys)}
+        self.letters = ''.join(ch for ch in keys if ch.isalpha() and ch.islower())
+
+    def nearby(self, target: str, rng=random) -> str:
+        """Return a character a typist using this layout might hit instead of `target`.
+
+        Characters that are not on the layout use the key of their base letter
+        (é -> e on layouts without é); anything else gets a random letter, in the
+        same case as the target.
+        """
+        if not target:
+            return ''
+        return self.pick(target, rng.random())
+
+    def pick(self, target: str, u: float) -> str:
+        """nearby() with the random draw given: `u` is a uniform float in [0, 1)."""
+        offset = self.index.get(target)
+        if offset is None:
+            base = unicodedata.normalize('NFD', target)[0]
+            offset = self.index.get(base)
+            if offset is None:
+                letter = self.letters[int(u * len(self.letters))]
+                return letter.upper() if target.isupper() else letter
+        return self.table[offset + int(u * TABLE_WIDTH)]
+
+
+_compiled = {}
+
+
+def _load_cache() -> dict:
+    try:
+        with open(CACHE_PATH, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        if cache.get('digest') == _definitions_digest():
+            return cache.get('layouts', {})
+    except (OSError, ValueError):
+        pass
+    return {}
+
+
+def _save_cache():
+    try:
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        layouts = {name: [layout.keys, layout.table] for name, layout in _compiled.items()}
+        atomic_write_text(CACHE_PATH, json.dumps({'digest': _definitions_digest(), 'layouts': layouts}))
+    except OSError:
+        pass
+
+
+def get_layout(name: str = DEFAULT_LAYOUT) -> KeyboardLayout:
+    """Return compiled layout `name` (see LAYOUTS), from memory, the disk cache or compiled now."""
+    layout = _compiled.get(name)
+    if layout is not None:
+        return layout
+    if name not in LAYOUTS:
+        raise ValueError(f"Unknown keyboard layout {name!r}; choose one of {', '.join(LAYOUTS)}")
+    if not _compiled:
+        for other, (keys, table) in _load_cache().items():
+            if other in LAYOUTS:
+                _compiled[other] = KeyboardLayout(other, keys, table)
+    layout = _compiled.get(name)
+    if layout is None:
+        layout = _compiled[name] = KeyboardLayout(name, *compile_layout(name))
+        _save_cache()
+    return layout
@@ -1,234 +1,89 @@
 import tkinter as tk
-from tkinter import ttk, filedialog
+from tkinter import ttk
 import tkinter.font as tkfont
 import time
 import threading
-import random
-import pyautogui # <-- The external application typing library
 import json
 import os
-import re
-
-# Configure PyAutoGUI settings
-pyautogui.PAUSE = 0 # No pause between PyAutoGUI calls by default (we manage the delay ourselves)
-pyautogui.FAILSAFE = True # Move the mouse to the top-left corner to stop the program
-
-
-def py_typewrite(text, interval=0):
-    """Compatibility wrapper that uses pyautogui.write if available, otherwise falls back to pyautogui.typewrite.
-
-    Raises a RuntimeError with module file info if neither is available to help diagnose shadowing.
+import shutil
+from collections import deque
+
+from backends import OUTPUT_BACKENDS, get_backend, is_failsafe_abort
+from eventlog import EventLog
+from instrument import RunTrace
+from layouts import LAYOUTS
+from storage import (ANALYSIS_CACHE_DIR, CHECKPOINT_FILE, DEFAULT_TEXT_FILE, BackgroundWriter, PagedDocument,
+                     atomic_write_text, load_checkpoint, load_config, read_document, run_fingerprint, text_file_path)
+from core import (DEFAULT_SETTINGS, PRESETS, DeadlineScheduler, EtaTable, IncrementalAnalyzer, LatestBuilder,
+                  LiveSettings, PlanRandom, RunControl, TypingCancelled, analysis_cache, delay_per_char,
+                  estimate_seconds_from_counts, estimate_typing_seconds, text_counts, type_text)
+
+
+# How often the GUI applies progress posted by the typing thread
+PROGRESS_FPS = 30
+# Quiet period after the last edit before the ETA is recomputed
+ETA_DEBOUNCE_MS = 150
+# How often the progress of a running run is saved, so it can be resumed after a crash
+CHECKPOINT_SECONDS = 2.0
+# Countdown before typing starts or resumes, to switch to the target application
+GRACE_SECONDS = 3
+# Written next to config.json after each run when the timing report is enabled
+TIMING_REPORT_FILE = 'timing_report.json'
+# Documents at least this large (in bytes) open in the paged, read-only large-document view
+LARGE_DOCUMENT_BYTES = 1_000_000
+# Runs of a large document, or of a text with at least this many characters, spread the ETA
+# evenly instead of building a per-character table (16 bytes per character)
+LARGE_TEXT_CHARS = 1_000_000
+# How often the GUI checks whether a large document's background analysis is done
+LARGE_POLL_MS = 200
+# Keystroke log of the latest run, written next to config.json (replay with cli.py --replay)
+RUN_LOG_FILE = 'last_run.htlog'
+
+
+class _EvenEta:
+    """EtaTable stand-in for very long texts: the expected total spread evenly over the characters."""
+
+    def __init__(self, total: float, length: int):
+        self.total = total
+        self.length = max(1, length)
+
+    def remaining(self, idx: int) -> float:
+        return self.total * (1 - min(max(idx, 0), self.length) / self.length)
+
+
+class ProgressChannel:
+    """Lock-free progress channel from the typing thread to the Tk thread.
+
+    The worker only assigns an int and appends to a deque (both atomic in CPython);
+    the GUI polls `typed` and drains the events from root.after at PROGRESS_FPS.
     """
-    if hasattr(pyautogui, 'write'):
-        return pyautogui.write(text, interval=interval)
-    if hasattr(pyautogui, 'typewrite'):
-        return pyautogui.typewrite(text, interval=interval)
-
-    # Diagnostic output to help figure out why the functions are missing.
-    try:
-        module_file = getattr(pyautogui, '__file__', None)
-        print("[diagnostic] pyautogui repr:", repr(pyautogui))
-        print("[diagnostic] pyautogui type:", type(pyautogui))
-        print("[diagnostic] pyautogui __file__:", module_file)
-        print("[diagnostic] pyautogui dir() (first 50):", dir(pyautogui)[:50])
-    except Exception as e:
-        print("[diagnostic] error while introspecting pyautogui:", e)
-
-    raise RuntimeError(
-        "pyautogui has no 'write' or 'typewrite'. This usually means PyAutoGUI is not installed or a local file is shadowing it. "
-        f"Module __file__: {module_file!r}.\nCheck your PYTHONPATH and ensure there's no local file named 'pyautogui.py' or a folder named 'pyautogui'."
-    )
-
-
-def _build_qwerty_neighbors():
-    """Build a mapping of characters to nearby keys on a standard QWERTY keyboard.
-
-    The mapping includes horizontal neighbors and approximate vertical neighbors by
-    looking at the same column index in adjacent rows when possible.
-    """
-    rows = [
-        "`1234567890-=",
-        "qwertyuiop[]\\",
-        "asdfghjkl;'",
-        "zxcvbnm,./",
-    ]
-    neighbors = {}
-    for r_idx, row in enumerate(rows):
-        for i, ch in enumerate(row):
-            s = set()
-            # horizontal neighbors
-            if i - 1 >= 0:
-                s.add(row[i - 1])
-            if i + 1 < len(row):
-                s.add(row[i + 1])
-
-            # vertical/diagonal neighbors from adjacent rows (approximate)
-            for adj in (r_idx - 1, r_idx + 1):
-                if 0 <= adj < len(rows):
-                    adj_row = rows[adj]
-                    # same column
-                    if i < len(adj_row):
-                        s.add(adj_row[i])
-                    # left diagonal
-                    if i - 1 >= 0 and i - 1 < len(adj_row):
-                        s.add(adj_row[i - 1])
-                    # right diagonal
-                    if i + 1 < len(adj_row) and i + 1 < len(adj_row):
-                        s.add(adj_row[i + 1])
-
-            neighbors[ch] = ''.join(sorted(s))
-
-    # add letters upper/lowercase variants and space
-    full = {}
-    for k, v in neighbors.items():
-        full[k] = v
-        if k.isalpha():
-            full[k.upper()] = ''.join(x.upper() if x.isalpha() else x for x in v)
-
-    # add a few common mappings for space and newline
-    full[' '] = 'bvn '  # keys near the space bar on many layouts
-    full['\n'] = full.get('\n', '\n')
-    return full
-
-
-_QW_NEIGHBORS = _build_qwerty_neighbors()
-
-
-def get_nearby_char(target: str) -> str:
-    """Return a nearby (adjacent-key) character for the given target char.
-
-    If no neighbor is known, fall back to a random lowercase letter.
-    """
-    if not target:
-        return ''
-    # preserve case: mapping contains both lower and upper where applicable
-    if target in _QW_NEIGHBORS and _QW_NEIGHBORS[target]:
-        choices = _QW_NEIGHBORS[target]
-        return random.choice(choices)
-
-    # If char not in our map (e.g., emoji), fall back to an adjacent letter
-    return random.choice('abcdefghijklmnopqrstuvwxyz')
 
-
-# Abbreviations to ignore when deciding if a period ends a sentence
-_ABBREVIATIONS = {"e.g", "i.e", "mr", "mrs", "dr", "jr", "sr", "vs", "etc", "prof", "rev", "st", "rd", "ave"}
-
-
-def is_sentence_terminator(text: str, idx: int) -> bool:
-    """Return True if the character at text[idx] is a real sentence terminator.
-
-    Avoid treating common abbreviations like 'e.g.' or 'Mr.' as sentence ends.
-    """
-    if idx < 0 or idx >= len(text):
-        return False
-    ch = text[idx]
-    if ch not in '.!?':
-        return False
-
-    # look backwards to find the word before the punctuation
-    j = idx - 1
-    while j >= 0 and text[j].isspace():
-        j -= 1
-    # collect letters/dots from the previous token up to some reasonable length
-    start = j
-    while start >= 0 and (text[start].isalpha() or text[start] == '.'):
-        start -= 1
-    word = text[start+1:j+1].lower()
-    # strip trailing dot parts
-    word = word.rstrip('.')
-    if not word:
-        return True
-    if word in _ABBREVIATIONS:
-        return False
-    return True
-
-
-def split_into_sentences(text: str):
-    """Regex-based sentence splitter that returns (start,end,sentence_text).
-
-    This uses punctuation-based splitting but tries to avoid common abbreviation splits and keeps
-    dialog/list lines together when possible.
-    """
-    sentences = []
-    # Normalize line endings
-    t = text.replace('\r\n', '\n').replace('\r', '\n')
-
-    # regex to find sentence-ending punctuation followed by space/newline and uppercase or quote
-    pattern = re.compile(r"(?P<sent>.+?(?:[\.\?!]+|\n|$))", re.DOTALL)
-    idx = 0
-    for m in pattern.finditer(t):
-        sent = m.group('sent')
-        if not sent or sent.strip() == '':
-            idx = m.end()
-            continue
-        start = idx
-        end = m.end()
-        s = sent.strip()
-        # avoid splitting on single-letter initials and common abbreviations
-        tail = s[-4:].lower()
-        if any(s.lower().endswith(ab + '.') for ab in _ABBREVIATIONS):
-            # keep going until next match
-            idx = end
-            continue
-
-        sentences.append((start, end, s))
-        idx = end
-
-    # merge short lines that are bullets or dialog into previous sentence if appropriate
-    merged = []
-    for start, end, s in sentences:
-        if merged:
-            prev_start, prev_end, prev_s = merged[-1]
-            # if current sentence is a single bullet/numbered line, merge
-            if re.match(r'^[\s]*([-*•]|\d+\.)\s+', s):
-                merged[-1] = (prev_start, end, (prev_s + '\n' + s).strip())
-                continue
-            # if current looks like dialog (starts with em-dash or name:), merge
-            if re.match(r'^[\s]*(—|-|[A-Z][a-z]+:)', s):
-                merged[-1] = (prev_start, end, (prev_s + ' ' + s).strip())
-                continue
-        merged.append((start, end, s))
-    return merged
-
-
-def classify_sentence(sent_text: str, full_text: str, start_idx: int, end_idx: int):
-    """Return a richer set of tags for the sentence.
-
-    Tags: quote, analysis, context, dialog, list, long
-    """
-    tags = set()
-    s = sent_text.strip()
-    lower = s.lower()
-
-    # quote detection: starts/ends with quotes or enclosed
-    if s.startswith(('"', '“', "'", '‘')) or s.endswith(('"', '”', "'", '’')):
-        tags.add('quote')
-    else:
-        before = full_text[:start_idx]
-        if before.count('"') % 2 == 1 or before.count("'") % 2 == 1:
-            tags.add('quote')
-
-    # dialog detection: em-dash, leading speaker tag or lines with quotes
-    if re.match(r'^[\-—]\s*', s) or re.match(r'^[A-Z][a-z]+:\s', s) or lower.startswith('said '):
-        tags.add('dialog')
-
-    # list detection: leading bullet or numbered markers
-    if re.match(r'^([-*•]|\d+\.)\s+', s):
-        tags.add('list')
-
-    # analysis detection: parentheses, 'note:', 'however', i.e./e.g.
-    if '(' in s or any(k in lower for k in ('note:', 'however', 'i.e.', 'e.g.', 'viz', 'namely')) or ':' in s[:20]:
-        tags.add('analysis')
-
-    # context detection: common lead-ins
-    if lower.startswith(('in conclusion', 'overall', 'context:', 'importantly', 'moreover', 'in summary', 'to conclude', 'therefore', 'consequently')):
-        tags.add('context')
-
-    # long sentence
-    if len(s) > 200:
-        tags.add('long')
-
-    return tags
+    def __init__(self):
+        self.typed = 0
+        self.events = deque()
+        # EtaTable for the run in .result; the worker requests a build whenever it picks up
+        # new settings, and it is built on a helper thread so typing never waits for it
+        self.eta = LatestBuilder()
+        # {'fingerprint', 'seed', 'rng'} of the run; with `typed` it is enough to resume it
+        self.checkpoint = None
+        # set by the worker when the whole text was typed
+        self.finished = False
+        # instrument.RunTrace of the run, when the timing report is enabled
+        self.trace = None
+
+    def set_progress(self, typed: int):
+        self.typed = typed
+
+    def post(self, kind: str, value=None):
+        self.events.append((kind, value))
+
+    def drain(self):
+        """Return and remove every pending (kind, value) event, oldest first."""
+        events = self.events
+        out = []
+        while events:
+            out.append(events.popleft())
+        return out
 
 
 class ToolTip:
@@ -268,28 +123,63 @@ class ExternalTypingSimulatorApp:
 
         # Load config or defaults
         self.config_path = os.path.join(os.path.dirname(__file__), 'config.json')
-        self.config = self.load_config()
+        self.config = load_config(self.config_path)
+        # The text lives in its own file next to config.json; saves happen on a background thread
+        self.text_file = self.config.get('text_file', DEFAULT_TEXT_FILE)
+        self.writer = BackgroundWriter()
+        # inline text from an older config is moved to the text file on the next save
+        self._document_dirty = 'text_to_type' in self.config
+        # Book-length documents are shown a page at a time from their file instead of in the editor
+        self.large_document = None
+        self._large_counts = None  # (document, text_counts, tag Counter) once analyzed off the Tk thread
+        self._editor_text_file = DEFAULT_TEXT_FILE  # the editor's document, restored when the view is closed
+        self.page = 0
+        doc_path = text_file_path(self.config, self.config_path)
+        if 'text_to_type' not in self.config and self._is_large(doc_path, self.config.get('large_document', False)):
+            self.large_document = PagedDocument(doc_path)
 
         # --- Variables ---
-        self.text_to_type = tk.StringVar(value=self.config.get('text_to_type', "This text will be typed into the active window."))
-        self.typing_speed_wpm = tk.DoubleVar(value=self.config.get('typing_speed_wpm', 40))  # Default WPM
+        initial_text = '' if self.large_document else read_document(self.config, self.config_path, "This text will be typed into the active window.")
+        self.text_to_type = tk.StringVar(value=initial_text)
+        self.typing_speed_wpm = tk.DoubleVar(value=self.config.get('typing_speed_wpm', DEFAULT_SETTINGS['typing_speed_wpm']))
         # Thinking pause controls
-        self.enable_thinking = tk.BooleanVar(value=self.config.get('enable_thinking', True))
-        self.mid_sentence_pause_chance = tk.DoubleVar(value=self.config.get('mid_sentence_pause_chance', 0.05))
-        self.mid_sentence_pause_seconds = tk.DoubleVar(value=self.config.get('mid_sentence_pause_seconds', 0.8))
-        self.sentence_pause_seconds = tk.DoubleVar(value=self.config.get('sentence_pause_seconds', 1.6))
+        self.enable_thinking = tk.BooleanVar(value=self.config.get('enable_thinking', DEFAULT_SETTINGS['enable_thinking']))
+        self.mid_sentence_pause_chance = tk.DoubleVar(value=self.config.get('mid_sentence_pause_chance', DEFAULT_SETTINGS['mid_sentence_pause_chance']))
+        self.mid_sentence_pause_seconds = tk.DoubleVar(value=self.config.get('mid_sentence_pause_seconds', DEFAULT_SETTINGS['mid_sentence_pause_seconds']))
+        self.sentence_pause_seconds = tk.DoubleVar(value=self.config.get('sentence_pause_seconds', DEFAULT_SETTINGS['sentence_pause_seconds']))
         # Major pause between paragraphs (preserve paragraph breaks)
-        self.paragraph_pause_seconds = tk.DoubleVar(value=self.config.get('paragraph_pause_seconds', 20.0))
+        self.paragraph_pause_seconds = tk.DoubleVar(value=self.config.get('paragraph_pause_seconds', DEFAULT_SETTINGS['paragraph_pause_seconds']))
         # Sentence-structure pause multipliers
-        self.quote_sentence_multiplier = tk.DoubleVar(value=self.config.get('quote_sentence_multiplier', 1.5))
-        self.analysis_sentence_multiplier = tk.DoubleVar(value=self.config.get('analysis_sentence_multiplier', 1.8))
-        self.context_sentence_multiplier = tk.DoubleVar(value=self.config.get('context_sentence_multiplier', 1.3))
-            # UI advanced toggle
-            self.show_advanced = tk.BooleanVar(value=self.config.get('show_advanced', True))
-            self.is_typing = False
+        self.quote_sentence_multiplier = tk.DoubleVar(value=self.config.get('quote_sentence_multiplier', DEFAULT_SETTINGS['quote_sentence_multiplier']))
+        self.analysis_sentence_multiplier = tk.DoubleVar(value=self.config.get('analysis_sentence_multiplier', DEFAULT_SETTINGS['analysis_sentence_multiplier']))
+        self.context_sentence_multiplier = tk.DoubleVar(value=self.config.get('context_sentence_multiplier', DEFAULT_SETTINGS['context_sentence_multiplier']))
+        # UI advanced toggle
+        self.show_advanced = tk.BooleanVar(value=self.config.get('show_advanced', True))
+        # Where keystrokes are sent (see OUTPUT_BACKENDS)
+        self.output_backend = tk.StringVar(value=self.config.get('output_backend', 'pyautogui'))
+        # Keyboard layout typos are drawn from (see layouts.py)
+        self.keyboard_layout = tk.StringVar(value=self.config.get('keyboard_layout', DEFAULT_SETTINGS['keyboard_layout']))
+        # Send runs of keys in one backend call (core.execute_plan burst mode)
+        self.burst_mode = tk.BooleanVar(value=self.config.get('burst_mode', DEFAULT_SETTINGS['burst_mode']))
+        # Opt-in per-run timing report (see instrument.py)
+        self.timing_report = tk.BooleanVar(value=self.config.get('timing_report', False))
+        self.is_typing = False
+        self.progress_channel = ProgressChannel()
+        # Pause/cancel switch and settings of the current run, and where its progress is checkpointed
+        self.run_control = None
+        self.live_settings = None
+        self.checkpoint_path = os.path.join(os.path.dirname(self.config_path), CHECKPOINT_FILE)
+        self._checkpoint_at = 0.0
+        # Cached sentence analysis for the ETA, refreshed at most once per ETA_DEBOUNCE_MS of edits
+        self.analyzer = IncrementalAnalyzer()
+        # Whole-document analyses, kept across sessions so a known document is never analyzed again
+        analysis_cache.directory = os.path.join(os.path.dirname(self.config_path), ANALYSIS_CACHE_DIR)
+        self._eta_after_id = None
 
         # --- GUI Setup ---
         self.setup_ui()
+        if self.large_document is not None:
+            self._show_large_document()
 
     def setup_ui(self):
         # Apply a minimal dark theme
@@ -330,6 +220,17 @@ class ExternalTypingSimulatorApp:
 
         # 1. Input Text Area (multiline to preserve indentation on paste)
         ttk.Label(main_frame, text="Text to Type (Ensure Target Window is Focused!):").grid(row=0, column=0, sticky=tk.W, pady=5)
+        doc_frame = ttk.Frame(main_frame)
+        doc_frame.grid(row=0, column=0, sticky=tk.E)
+        open_button = ttk.Button(doc_frame, text="Open Large Document...", command=self.open_large_document)
+        open_button.grid(row=0, column=0, padx=6)
+        ToolTip(open_button, "Show a long text file a page at a time, read-only, without loading it into the editor.")
+        # page navigation, only shown for a large document
+        self.page_prev = ttk.Button(doc_frame, text="<", width=3, command=lambda: self.show_page(self.page - 1))
+        self.page_label = ttk.Label(doc_frame, text="")
+        self.page_next = ttk.Button(doc_frame, text=">", width=3, command=lambda: self.show_page(self.page + 1))
+        self.close_large = ttk.Button(doc_frame, text="Back to Editor", command=self.close_large_document)
+        self.page_widgets = (self.page_prev, self.page_label, self.page_next, self.close_large)
         self.input_text = tk.Text(main_frame, width=80, height=6, font=default_font, wrap='none', undo=True)
         self.input_text.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=5)
         # Put initial content into the Text widget
@@ -337,11 +238,16 @@ class ExternalTypingSimulatorApp:
         ToolTip(self.input_text, "Text that will be typed into the active window. Pasting preserves indentation.")
         # track modifications and sync to the StringVar for backward compatibility
         def _on_text_modified(event=None):
+            if self.large_document is not None:
+                # a page was loaded into the read-only view; nothing to mirror or save
+                self.input_text.edit_modified(False)
+                return
             try:
                 text = self.input_text.get('1.0', 'end-1c')
                 # Update the StringVar without causing recursion
                 self.text_to_type.set(text)
-                self.update_eta_display()
+                self._document_dirty = True
+                self.schedule_eta_update()
             except Exception:
                 pass
             # clear the modified flag
@@ -353,7 +259,7 @@ class ExternalTypingSimulatorApp:
         # Bind modifications (covers paste, typing, and programmatic changes)
         self.input_text.bind('<<Modified>>', _on_text_modified)
         # Also update ETA on explicit key release (helpful for some paste scenarios)
-        self.input_text.bind('<KeyRelease>', lambda e: self.update_eta_display())
+        self.input_text.bind('<KeyRelease>', lambda e: self.schedule_eta_update())
 
         # 2. WPM Slider
         ttk.Label(main_frame, text="Typing Rate (WPM):").grid(row=2, column=0, sticky=tk.W, pady=5)
@@ -395,6 +301,16 @@ class ExternalTypingSimulatorApp:
         self.status_label = ttk.Label(main_frame, text="Status: Ready. Click the button and quickly switch windows.")
         self.status_label.grid(row=5, column=0, pady=5)
 
+        # Pause/resume and cancel for the current run
+        run_frame = ttk.Frame(main_frame)
+        run_frame.grid(row=5, column=1, columnspan=2, sticky=tk.W, padx=6)
+        self.pause_button = ttk.Button(run_frame, text="Pause", command=self.toggle_pause, state=tk.DISABLED)
+        self.pause_button.grid(row=0, column=0, padx=(0, 6))
+        ToolTip(self.pause_button, "Pause typing; resuming gives you a few seconds to switch back to the target app.")
+        self.cancel_button = ttk.Button(run_frame, text="Cancel", command=self.cancel_typing, state=tk.DISABLED)
+        self.cancel_button.grid(row=0, column=1)
+        ToolTip(self.cancel_button, "Stop typing. Starting again on the same text offers to resume where it stopped.")
+
         # 5. Thinking pause controls
         thinking_frame = ttk.Frame(main_frame, padding=(0,8,0,0))
         thinking_frame.grid(row=6, column=0, sticky=(tk.W, tk.E))
@@ -461,6 +377,22 @@ class ExternalTypingSimulatorApp:
         self.preset_combo.grid(row=0, column=1, padx=6)
         # Map selection to our preset keys and apply
         self.preset_combo.bind('<<ComboboxSelected>>', lambda e: self.apply_preset('deep' if self.preset_var.get() == 'Deep Thinker' else self.preset_var.get().lower()))
+        ttk.Label(preset_frame, text="Output:").grid(row=0, column=2, sticky=tk.W, padx=(12,0))
+        self.backend_combo = ttk.Combobox(preset_frame, textvariable=self.output_backend, values=list(OUTPUT_BACKENDS), state='readonly', width=12)
+        self.backend_combo.grid(row=0, column=3, padx=6)
+        self.backend_combo.bind('<<ComboboxSelected>>', lambda e: self.save_config())
+        ToolTip(self.backend_combo, "pyautogui: portable (failsafe works). xtest: direct X11, faster. null/record: no output, for testing.")
+        ttk.Label(preset_frame, text="Layout:").grid(row=0, column=4, sticky=tk.W, padx=(12,0))
+        self.layout_combo = ttk.Combobox(preset_frame, textvariable=self.keyboard_layout, values=list(LAYOUTS), state='readonly', width=10)
+        self.layout_combo.grid(row=0, column=5, padx=6)
+        self.layout_combo.bind('<<ComboboxSelected>>', lambda e: self.save_config())
+        ToolTip(self.layout_combo, "Keyboard layout of the target machine; typos hit keys next to the intended one.")
+        self.burst_check = ttk.Checkbutton(preset_frame, text='Burst mode', variable=self.burst_mode, command=self.save_config)
+        self.burst_check.grid(row=0, column=6, padx=6)
+        ToolTip(self.burst_check, "Send runs of keys between typos and pauses in one call, keeping their timing. Needed for several hundred WPM.")
+        self.report_check = ttk.Checkbutton(preset_frame, text='Timing report', variable=self.timing_report, command=self.save_config)
+        self.report_check.grid(row=0, column=7, padx=6)
+        ToolTip(self.report_check, f"Record where time goes during each run and write {TIMING_REPORT_FILE} next to config.json.")
 
         cfg_btn_frame = ttk.Frame(main_frame)
         cfg_btn_frame.grid(row=8, column=0, sticky=(tk.W, tk.E), pady=(6,0))
@@ -487,7 +419,7 @@ class ExternalTypingSimulatorApp:
         self.paragraph_pause_seconds.trace_add('write', lambda *_: self.save_config())
 
         # Update ETA when the input text changes (covers paste and programmatic changes)
-        self.text_to_type.trace_add('write', lambda *_: self.update_eta_display())
+        self.text_to_type.trace_add('write', lambda *_: self.schedule_eta_update())
 
 
 
@@ -497,70 +429,64 @@ class ExternalTypingSimulatorApp:
 
     def get_delay_per_char(self):
         """Calculates the delay (in seconds) between characters based on WPM."""
-        wpm = self.typing_speed_wpm.get()
-        # 5 characters per word
-        characters_per_minute = wpm * 5
-        characters_per_second = characters_per_minute / 60
-        
-        # Delay is the reciprocal
-        if characters_per_second > 0:
-            return 1 / characters_per_second
-        return 0.1 # Default safe minimum delay
+        return delay_per_char(self.typing_speed_wpm.get())
+
+    def get_settings(self) -> dict:
+        """Return the current timing settings as a plain dict (config.json keys)."""
+        return {
+            'typing_speed_wpm': float(self.typing_speed_wpm.get()),
+            'enable_thinking': bool(self.enable_thinking.get()),
+            'mid_sentence_pause_chance': float(self.mid_sentence_pause_chance.get()),
+            'mid_sentence_pause_seconds': float(self.mid_sentence_pause_seconds.get()),
+            'sentence_pause_seconds': float(self.sentence_pause_seconds.get()),
+            'paragraph_pause_seconds': float(self.paragraph_pause_seconds.get()),
+            'quote_sentence_multiplier': float(self.quote_sentence_multiplier.get()),
+            'analysis_sentence_multiplier': float(self.analysis_sentence_multiplier.get()),
+            'context_sentence_multiplier': float(self.context_sentence_multiplier.get()),
+            'keyboard_layout': self.keyboard_layout.get(),
+            'burst_mode': bool(self.burst_mode.get()),
+        }
 
     def estimate_remaining_seconds(self, text: str, idx: int) -> float:
         """Estimate remaining time in seconds to type the rest of `text` starting at index `idx`.
 
-        Uses current WPM, a fixed mistake overhead, and enabled thinking pause settings.
-        This is a best-effort estimate and updates during typing.
+        Uses the same timing model as the typing run (see compile_plan). Sentence analysis
+        comes from the analysis cache for a document analyzed before, else from self.analyzer,
+        so only paragraphs edited since the last call are re-analyzed.
         """
         remaining = text[idx:]
-        # base delay per char
-        base = self.get_delay_per_char()
-        chars = max(1, len(remaining))
-
-        # approximate extra time for mistakes: assume mistake rate equals the mid-word pause chance
-        mistake_rate = float(self.mid_sentence_pause_chance.get())
-        # assume each mistake costs ~1.5 characters worth of time (insert + backspace + pause)
-        mistake_overhead = 1.5 * base
-
-        # thinking pauses: approximate how many pauses will occur
-        thinking_overhead = 0.0
-        if self.enable_thinking.get():
-            # rough heuristic: one mid-word pause per (1/mid_chance) characters on average
-            mid_chance = float(self.mid_sentence_pause_chance.get())
-            if mid_chance > 0:
-                expected_mid_pauses = chars * mid_chance
-                thinking_overhead += expected_mid_pauses * float(self.mid_sentence_pause_seconds.get())
-
-            # sentence-level pauses: split into sentences and classify
-            sentences = split_into_sentences(remaining)
-            for start_i, end_i, sent in sentences:
-                pause = float(self.sentence_pause_seconds.get())
-                tags = classify_sentence(sent, remaining, start_i, end_i)
-                # apply multipliers
-                if 'quote' in tags:
-                    pause *= float(self.quote_sentence_multiplier.get())
-                if 'analysis' in tags or 'long' in tags:
-                    pause *= float(self.analysis_sentence_multiplier.get())
-                if 'context' in tags:
-                    pause *= float(self.context_sentence_multiplier.get())
-                # dialog/list have smaller pauses
-                if 'dialog' in tags or 'list' in tags:
-                    pause *= 0.7
-                thinking_overhead += pause
-
-            # paragraph pauses: count double-newline occurrences as paragraph breaks
-            paragraph_count = remaining.count('\n\n')
-            thinking_overhead += paragraph_count * float(self.paragraph_pause_seconds.get())
-
-        # total base typing time
-        typing_time = chars * base
-        mistakes_time = chars * mistake_rate * mistake_overhead
-
-        total = typing_time + mistakes_time + thinking_overhead
-        return total
+        settings = self.get_settings()
+        tag_counts = None
+        if settings['enable_thinking']:
+            cached = analysis_cache.peek(remaining)
+            tag_counts = cached.tag_counts() if cached is not None else self.analyzer.tag_counts(remaining)
+        return estimate_typing_seconds(remaining, settings, tag_counts)
+
+    @staticmethod
+    def format_eta(secs: float) -> str:
+        mins = int(secs) // 60
+        sec = int(secs) % 60
+        return f"ETA: {mins:02d}:{sec:02d}"
+
+    def schedule_eta_update(self):
+        """Debounce ETA refreshes so a burst of edits triggers a single recomputation."""
+        if self._eta_after_id is not None:
+            try:
+                self.root.after_cancel(self._eta_after_id)
+            except Exception:
+                pass
+        self._eta_after_id = self.root.after(ETA_DEBOUNCE_MS, self._run_scheduled_eta_update)
+
+    def _run_scheduled_eta_update(self):
+        self._eta_after_id = None
+        self.update_eta_display()
+        # edits have settled; persist the text too
+        self.save_document()
 
     def update_eta_display(self, text=None, idx=0):
+        if text is None and self.large_document is not None:
+            self.eta_label.config(text=self._large_eta())
+            return
         try:
             if text is None:
                 try:
@@ -568,9 +494,7 @@ class ExternalTypingSimulatorApp:
                 except Exception:
                     text = self.text_to_type.get()
             secs = self.estimate_remaining_seconds(text, idx)
-            mins = int(secs) // 60
-            sec = int(secs) % 60
-            self.eta_label.config(text=f"ETA: {mins:02d}:{sec:02d}")
+            self.eta_label.config(text=self.format_eta(secs))
         except Exception:
             self.eta_label.config(text="ETA: --:--")
 
@@ -606,18 +530,11 @@ class ExternalTypingSimulatorApp:
         except Exception:
             pass
 
-    def load_config(self):
-        try:
-            if os.path.exists(self.config_path):
-                with open(self.config_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-        except Exception:
-            pass
-        return {}
-
     def save_config(self):
+        """Save the settings (and the text, if it changed) without blocking the UI."""
         cfg = {
-            'text_to_type': self.input_text.get('1.0', 'end-1c'),
+            'text_file': self.text_file,
+            'large_document': self.large_document is not None,
             'typing_speed_wpm': float(self.typing_speed_wpm.get()),
             'enable_thinking': bool(self.enable_thinking.get()),
             'mid_sentence_pause_chance': float(self.mid_sentence_pause_chance.get()),
@@ -627,61 +544,144 @@ class ExternalTypingSimulatorApp:
             'quote_sentence_multiplier': float(self.quote_sentence_multiplier.get()),
             'analysis_sentence_multiplier': float(self.analysis_sentence_multiplier.get()),
             'context_sentence_multiplier': float(self.context_sentence_multiplier.get()),
+            'keyboard_layout': self.keyboard_layout.get(),
+            'burst_mode': bool(self.burst_mode.get()),
             'show_advanced': bool(self.show_advanced.get()),
+            'output_backend': self.output_backend.get(),
+            'timing_report': bool(self.timing_report.get()),
         }
+        self.writer.submit(self.config_path, json.dumps(cfg, indent=2))
+        self.save_document()
+        if self.live_settings is not None:
+            # the running engine picks this up at its next sentence boundary
+            self.live_settings.publish(self.get_settings())
+
+    def save_document(self):
+        """Write the text to its own file, only if it changed since the last save."""
+        if not self._document_dirty or self.large_document is not None:
+            # a large document is read-only: the view only holds one page of it
+            return
+        self._document_dirty = False
         try:
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(cfg, f, indent=2)
+            text = self.input_text.get('1.0', 'end-1c')
         except Exception:
-            pass
+            text = self.text_to_type.get()
+        self.writer.submit(text_file_path({'text_file': self.text_file}, self.config_path), text)
+
+    @staticmethod
+    def _is_large(path: str, flagged: bool = False) -> bool:
+        """Whether the document at `path` belongs in the large-document view."""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return False
+        return flagged or size >= LARGE_DOCUMENT_BYTES
+
+    def open_large_document(self):
+        from tkinter import filedialog
+        fpath = filedialog.askopenfilename(filetypes=[('Text files', '*.txt'), ('All files', '*')])
+        if not fpath or self.is_typing:
+            return
+        try:
+            self._open_large(fpath)
+        except OSError as e:
+            self.status_label.config(text=f"Status: Could not open {os.path.basename(fpath)}: {e}")
+            return
+        self.save_config()
+
+    def _open_large(self, path: str):
+        """Show `path` in the large-document view; the file is only ever read."""
+        document = PagedDocument(path)
+        if self.large_document is None:
+            # keep what was typed into the editor before it is replaced by pages
+            self.save_document()
+            self._editor_text_file = self.text_file
+        self.large_document = document
+        self.text_file = path
+        self._show_large_document()
+
+    def _show_large_document(self):
+        """Fill the view from self.large_document and analyze it for the ETA in the background."""
+        document = self.large_document
+        self._large_counts = None
+        self.text_to_type.set('')
+        for column, widget in enumerate(self.page_widgets, 1):
+            widget.grid(row=0, column=column, padx=3)
+        self.show_page(0)
+        threading.Thread(target=self._analyze_large, args=(document,), daemon=True).start()
+        self.root.after(LARGE_POLL_MS, self._poll_large_counts)
+
+    def _analyze_large(self, document):
+        """Runs on a worker thread: the counts the ETA needs, without keeping the text."""
+        try:
+            text = document.read_all()
+            counts = text_counts(text)
+            # also leaves the analysis in the cache for the typing run
+            tag_counts = analysis_cache.get(text).tag_counts()
+        except Exception:
+            # counts of None tell _poll_large_counts to stop waiting
+            counts = tag_counts = None
+        self._large_counts = (document, counts, tag_counts)
+
+    def _poll_large_counts(self):
+        if self.large_document is None:
+            return
+        info = self._large_counts
+        if info is not None and info[0] is self.large_document:
+            if info[1] is None:
+                self.status_label.config(text=f"Status: Could not analyze {os.path.basename(info[0].path)}")
+            self.update_eta_display()
+        else:
+            self.root.after(LARGE_POLL_MS, self._poll_large_counts)
+
+    def _large_eta(self) -> str:
+        info = self._large_counts
+        if info is None or info[0] is not self.large_document or info[1] is None:
+            return "ETA: --:--"
+        _, counts, tag_counts = info
+        return self.format_eta(estimate_seconds_from_counts(counts, self.get_settings(), tag_counts))
+
+    def show_page(self, n: int):
+        """Show page `n` of the large document in the (read-only) text view."""
+        document = self.large_document
+        if document is None:
+            return
+        n = min(max(n, 0), len(document) - 1)
+        self.page = n
+        widget = self.input_text
+        widget.config(state=tk.NORMAL)
+        widget.delete('1.0', 'end')
+        widget.insert('1.0', document.page(n))
+        widget.config(state=tk.DISABLED)
+        widget.edit_reset()
+        self.page_label.config(text=f"Page {n + 1} of {len(document)}")
+        self.page_prev.config(state=tk.NORMAL if n > 0 else tk.DISABLED)
+        self.page_next.config(state=tk.NORMAL if n < len(document) - 1 else tk.DISABLED)
+
+    def _leave_large_view(self):
+        """Empty the view and make it an editor again; the caller fills it."""
+        self.input_text.config(state=tk.NORMAL)
+        self.input_text.delete('1.0', 'end')
+        self.input_text.edit_reset()
+        self.large_document = None
+        self._large_counts = None
+        self.text_file = self._editor_text_file
+        for widget in self.page_widgets:
+            widget.grid_remove()
+
+    def close_large_document(self):
+        """Go back to editing the document that was open before the large one."""
+        if self.is_typing:
+            return
+        self._leave_large_view()
+        text = read_document({'text_file': self.text_file}, self.config_path)
+        self.input_text.insert('1.0', text)
+        self.input_text.edit_reset()
+        self.text_to_type.set(text)
+        self.save_config()
 
     def apply_preset(self, name: str):
-        presets = {
-            'conservative': {
-                'typing_speed_wpm': 30,
-                'enable_thinking': True,
-                'mid_sentence_pause_chance': 0.02,
-                'mid_sentence_pause_seconds': 0.5,
-                'sentence_pause_seconds': 1.0,
-                'paragraph_pause_seconds': 45.0,
-            },
-            'normal': {
-                'typing_speed_wpm': 45,
-                'enable_thinking': True,
-                'mid_sentence_pause_chance': 0.05,
-                'mid_sentence_pause_seconds': 0.8,
-                'sentence_pause_seconds': 1.6,
-                'paragraph_pause_seconds': 20.0,
-                'quote_sentence_multiplier': 1.4,
-                'analysis_sentence_multiplier': 1.6,
-                'context_sentence_multiplier': 1.2,
-            },
-            'deep': {
-                'typing_speed_wpm': 35,
-                'enable_thinking': True,
-                'mid_sentence_pause_chance': 0.12,
-                'mid_sentence_pause_seconds': 1.6,
-                'sentence_pause_seconds': 3.0,
-                'paragraph_pause_seconds': 60.0,
-                'quote_sentence_multiplier': 1.6,
-                'analysis_sentence_multiplier': 2.0,
-                'context_sentence_multiplier': 1.4,
-            }
-            ,
-            'student': {
-                # Average student typist: moderate speed, moderate mistakes
-                'typing_speed_wpm': 38,
-                'enable_thinking': True,
-                'mid_sentence_pause_chance': 0.07,
-                'mid_sentence_pause_seconds': 0.9,
-                'sentence_pause_seconds': 1.8,
-                'paragraph_pause_seconds': 15.0,
-                'quote_sentence_multiplier': 1.3,
-                'analysis_sentence_multiplier': 1.5,
-                'context_sentence_multiplier': 1.2,
-            }
-        }
-        p = presets.get(name)
+        p = PRESETS.get(name)
         if not p:
             return
         self.typing_speed_wpm.set(p['typing_speed_wpm'])
@@ -697,11 +697,14 @@ class ExternalTypingSimulatorApp:
         self.save_config()
 
     def save_config_as(self):
+        from tkinter import filedialog
         fpath = filedialog.asksaveasfilename(defaultextension='.json', filetypes=[('JSON files','*.json')])
         if not fpath:
             return
+        # the text goes to a sibling .txt file, referenced from the exported config
+        text_file = os.path.splitext(os.path.basename(fpath))[0] + '.txt'
         cfg = {
-            'text_to_type': self.input_text.get('1.0', 'end-1c'),
+            'text_file': text_file,
             'typing_speed_wpm': float(self.typing_speed_wpm.get()),
             'enable_thinking': bool(self.enable_thinking.get()),
             'mid_sentence_pause_chance': float(self.mid_sentence_pause_chance.get()),
@@ -709,30 +712,41 @@ class ExternalTypingSimulatorApp:
             'sentence_pause_seconds': float(self.sentence_pause_seconds.get()),
         }
         try:
-            with open(fpath, 'w', encoding='utf-8') as f:
-                json.dump(cfg, f, indent=2)
+            if self.large_document is not None:
+                cfg['large_document'] = True
+                shutil.copyfile(self.large_document.path, text_file_path(cfg, fpath))
+            else:
+                atomic_write_text(text_file_path(cfg, fpath), self.input_text.get('1.0', 'end-1c'))
+            atomic_write_text(fpath, json.dumps(cfg, indent=2))
         except Exception:
             pass
 
     def load_config_from_dialog(self):
+        from tkinter import filedialog
         fpath = filedialog.askopenfilename(filetypes=[('JSON files','*.json')])
         if not fpath:
             return
         try:
             with open(fpath, 'r', encoding='utf-8') as f:
                 cfg = json.load(f)
-            # apply - write into the Text widget so indentation is preserved
-            text_val = cfg.get('text_to_type', self.input_text.get('1.0', 'end-1c'))
-            try:
-                self.input_text.delete('1.0', 'end')
-                self.input_text.insert('1.0', text_val)
-                # ensure StringVar stays in sync
+            doc_path = text_file_path(cfg, fpath)
+            if 'text_to_type' not in cfg and self._is_large(doc_path, cfg.get('large_document', False)):
+                self._open_large(doc_path)
+            else:
+                if self.large_document is not None:
+                    self._leave_large_view()
+                # apply - write into the Text widget so indentation is preserved
+                text_val = read_document(cfg, fpath, self.input_text.get('1.0', 'end-1c'))
                 try:
-                    self.text_to_type.set(text_val)
+                    self.input_text.delete('1.0', 'end')
+                    self.input_text.insert('1.0', text_val)
+                    # ensure StringVar stays in sync
+                    try:
+                        self.text_to_type.set(text_val)
+                    except Exception:
+                        pass
                 except Exception:
-                    pass
-            except Exception:
-                self.text_to_type.set(text_val)
+                    self.text_to_type.set(text_val)
             self.typing_speed_wpm.set(cfg.get('typing_speed_wpm', self.typing_speed_wpm.get()))
             self.enable_thinking.set(cfg.get('enable_thinking', self.enable_thinking.get()))
             self.mid_sentence_pause_chance.set(cfg.get('mid_sentence_pause_chance', self.mid_sentence_pause_chance.get()))
@@ -742,115 +756,217 @@ class ExternalTypingSimulatorApp:
         except Exception:
             pass
 
-    def simulate_typing(self):
-        """The core logic that sends keystrokes with delays and mistakes via pyautogui."""
-        if self.is_typing:
-            return
-        
-        self.is_typing = True
-        self.simulate_button.config(text="Typing...", state=tk.DISABLED)
-        self.status_label.config(text="Status: Typing in the focused external application.")
-
-        # Give the user a grace period to switch to the target application (e.g., Notepad)
-        self.status_label.config(text="Switch to your target application NOW (3 seconds)...")
-        self.root.update()
-        time.sleep(3) 
-
-        text = self.text_to_type.get()
-        # Prefer reading directly from the Text widget to preserve indentation
+    def simulate_typing(self, text, live, backend_name='pyautogui', resume=None, trace=None, even_eta=False):
+        """The core logic that sends keystrokes with delays and mistakes via an output backend.
+
+        Runs on the typing thread and never touches Tk directly: settings come from
+        `live` (a core.LiveSettings the GUI republishes when a control changes),
+        progress and status go through self.progress_channel and are applied by
+        _pump_progress, and pausing and cancelling go through self.run_control. `resume` is a checkpoint of an
+        earlier run of the same text and settings; its characters are not typed again.
+        With a `trace` (instrument.RunTrace), a timing report is written when the run ends.
+        With `even_eta` the ETA is spread evenly over the text instead of built per character.
+        Every run is logged to RUN_LOG_FILE so it can be replayed if it misbehaved.
+        """
+        channel = self.progress_channel
+        control = self.run_control
+        backend = None
+        log = None
         try:
-            text = self.input_text.get('1.0', 'end-1c')
-        except Exception:
-            text = self.text_to_type.get()
+            # Give the user a grace period to switch to the target application (e.g., Notepad)
+            if control.sleep(GRACE_SECONDS):
+                control.hold()
+            channel.post('status', "Status: Typing in the focused external application.")
 
-        # Typing Simulation Loop
-        try:
-            # Initialize progress bar
-            total_chars = max(1, len(text))
-            self.progress['maximum'] = total_chars
-            self.progress['value'] = 0
-            self.root.update()
-            # Pre-split sentences to know pause multipliers per sentence
-            sentence_ranges = split_into_sentences(text)
-            # Build a map of end_index -> multiplier
-            end_to_multiplier = {}
-            for s_start, s_end, s_text in sentence_ranges:
-                tags = classify_sentence(s_text, text, s_start, s_end)
-                multiplier = 1.0
-                if 'quote' in tags:
-                    multiplier *= float(self.quote_sentence_multiplier.get())
-                if 'analysis' in tags or 'long' in tags:
-                    multiplier *= float(self.analysis_sentence_multiplier.get())
-                if 'context' in tags:
-                    multiplier *= float(self.context_sentence_multiplier.get())
-                if 'dialog' in tags or 'list' in tags:
-                    multiplier *= 0.7
-                end_to_multiplier[s_end - 1] = multiplier
-
-            for i, char in enumerate(text):
-                # Calculate base delay, then add a slight human-like random variation
-                base_delay = self.get_delay_per_char()
-                delay = base_delay * (random.uniform(0.8, 1.2))
-                
-                # --- Mistake Simulation (e.g., 5% chance of a typo) ---
-                if random.random() < 0.05 and char:
-                    # pick a nearby key based on QWERTY adjacency
-                    wrong_char = get_nearby_char(char)
-                    # fallback to a random letter if mapping missing
-                    if not wrong_char:
-                        wrong_char = random.choice('abcdefghijklmnopqrstuvwxyz')
-                        if char.isupper():
-                            wrong_char = wrong_char.upper()
-
-                    py_typewrite(wrong_char, interval=0) # Type instantly
-                    time.sleep(base_delay * 2) # Longer pause for the mistake
-
-                    # Simulate the backspace to correct
-                    pyautogui.press('backspace')
-                    time.sleep(base_delay * 0.5) # Short delay for backspace press
-
-                # --- Thinking pauses ---
-                if self.enable_thinking.get():
-                    # mid-word/word pause
-                    if random.random() < self.mid_sentence_pause_chance.get() and not char.isspace():
-                        time.sleep(self.mid_sentence_pause_seconds.get())
-                    # longer pause on sentence end
-                        if char in '.!?':
-                            # base sentence pause
-                            pause = float(self.sentence_pause_seconds.get())
-                            # apply multiplier if this index corresponds to a sentence end
-                            mult = end_to_multiplier.get(i, 1.0)
-                            time.sleep(pause * mult)
-
-                # --- Type the correct character ---
-                py_typewrite(char, interval=0) # Type instantly, delay is managed by time.sleep
-                time.sleep(delay)
-                # update progress
-                try:
-                    self.progress['value'] = i + 1
-                    self.root.update()
-                except Exception:
-                    pass
-        except pyautogui.FailSafeException:
-            # User moved mouse to a corner to abort
-            self.status_label.config(text="Status: Aborted by PyAutoGUI failsafe (mouse moved to corner).")
-        except Exception as e:
-            self.status_label.config(text=f"Status: Error during simulation: {e}")
-        finally:
-            # Ensure state is reset
+            # Typing Simulation Loop
+            backend = get_backend(backend_name)
             try:
-                self.progress['value'] = 0
-            except Exception:
+                log = EventLog(os.path.join(os.path.dirname(self.config_path), RUN_LOG_FILE))
+            except OSError:
                 pass
-            self.simulate_button.config(text="Start Typing (Switch to Target App in 3s)", state=tk.NORMAL)
-            self.is_typing = False
+            # The plan is a pure function of the text, settings and seed, so a checkpoint
+            # only needs the seed and the number of characters typed to rebuild it
+            if resume:
+                rng = PlanRandom(resume['seed'], resume.get('rng', 'auto'))
+            else:
+                rng = PlanRandom()
+            skip = resume['typed'] if resume else 0
+            channel.checkpoint = {'fingerprint': run_fingerprint(text), 'seed': rng.seed,
+                                  'rng': rng.backend}
+
+            def settings_changed(settings, multipliers):
+                if even_eta:
+                    channel.eta.request(lambda: _EvenEta(estimate_typing_seconds(text, settings), len(text)))
+                else:
+                    channel.eta.request(lambda: EtaTable(text, settings, multipliers))
+
+            # Each sentence is compiled just before it is typed, with the latest settings
+            scheduler = DeadlineScheduler(control=control)
+            type_text(text, live, backend, rng=rng, on_char=channel.set_progress,
+                      scheduler=scheduler, skip_chars=skip, trace=trace, on_settings=settings_changed, log=log)
+            channel.finished = True
+            report = scheduler.report()
+            channel.post('status', f"Status: Done in {report['actual_seconds']:.1f}s "
+                                   f"(drift {report['drift_seconds']:+.2f}s).")
+        except TypingCancelled:
+            channel.post('status', f"Status: Cancelled after {channel.typed} characters. "
+                                   "Start again on the same text to resume.")
+        except Exception as e:
+            if is_failsafe_abort(e):
+                # User moved mouse to a corner to abort
+                channel.post('status', "Status: Aborted by PyAutoGUI failsafe (mouse moved to corner).")
+            else:
+                channel.post('status', f"Status: Error during simulation: {e}")
+        finally:
+            if backend is not None:
+                backend.close()
+            if log is not None:
+                log.close()
+            if trace is not None:
+                report_path = os.path.join(os.path.dirname(self.config_path), TIMING_REPORT_FILE)
+                self.writer.submit(report_path, json.dumps(trace.report(live.current), indent=2))
+            channel.post('done')
+
+    def save_checkpoint(self, channel):
+        """Save how far the run got (or forget it once the run finished), off the Tk thread."""
+        if channel.finished:
+            self.writer.submit(self.checkpoint_path, None)
+        elif channel.checkpoint is not None and channel.typed:
+            checkpoint = dict(channel.checkpoint, typed=channel.typed)
+            self.writer.submit(self.checkpoint_path, json.dumps(checkpoint))
+
+    def _pump_progress(self):
+        """Apply progress and status posted by the typing thread, at PROGRESS_FPS."""
+        channel = self.progress_channel
+        started = time.perf_counter()
+        done = False
+        for kind, value in channel.drain():
+            if kind == 'status':
+                self.status_label.config(text=value)
+            elif kind == 'length':
+                self.progress['maximum'] = max(1, value)
+            elif kind == 'ask_resume':
+                typed, length, answer, ready = value
+                from tkinter import messagebox
+                try:
+                    answer['yes'] = messagebox.askyesno("Resume typing", f"A previous run of this text stopped after "
+                                                                         f"{typed} of {length} characters.\n\n"
+                                                                         "Resume from there?")
+                finally:
+                    ready.set()
+            elif kind == 'done':
+                done = True
+        if not done:
+            self.progress['value'] = channel.typed
+            eta_table = channel.eta.result
+            if eta_table is not None:
+                self.eta_label.config(text=self.format_eta(eta_table.remaining(channel.typed)))
+            now = time.monotonic()
+            if now - self._checkpoint_at >= CHECKPOINT_SECONDS:
+                self._checkpoint_at = now
+                self.save_checkpoint(channel)
+            if channel.trace is not None:
+                channel.trace.add_phase('tk_update', time.perf_counter() - started)
+            self.root.after(1000 // PROGRESS_FPS, self._pump_progress)
+            return
+        self.save_checkpoint(channel)
+        # Ensure state is reset
+        self.progress['value'] = 0
+        self.simulate_button.config(text="Start Typing (Switch to Target App in 3s)", state=tk.NORMAL)
+        self.pause_button.config(text="Pause", state=tk.DISABLED)
+        self.cancel_button.config(state=tk.DISABLED)
+        self.run_control = None
+        self.live_settings = None
+        self.is_typing = False
+        self.update_eta_display()
+
+    def toggle_pause(self):
+        """Pause the run, or resume it after a GRACE_SECONDS countdown."""
+        control = self.run_control
+        if control is None:
+            return
+        if not control.paused:
+            control.pause()
+            self.pause_button.config(text="Resume")
+            self.status_label.config(text="Status: Paused.")
+            # a pause is a good moment to save exact progress
+            self.save_checkpoint(self.progress_channel)
+            return
+        self.pause_button.config(state=tk.DISABLED)
+        self.status_label.config(text=f"Resuming in {GRACE_SECONDS}s - switch to your target application NOW...")
+        self.root.after(GRACE_SECONDS * 1000, lambda: self._resume_run(control))
 
+    def _resume_run(self, control):
+        if control is not self.run_control or control.cancelled:
+            return
+        control.resume()
+        self.pause_button.config(text="Pause", state=tk.NORMAL)
+        self.status_label.config(text="Status: Typing in the focused external application.")
+
+    def cancel_typing(self):
+        if self.run_control is not None:
+            self.run_control.cancel()
+            self.pause_button.config(state=tk.DISABLED)
+            self.cancel_button.config(state=tk.DISABLED)
 
     def start_typing_thread(self):
         """Starts the typing simulation in a separate thread to keep the GUI responsive."""
-        if not self.is_typing:
-            typing_thread = threading.Thread(target=self.simulate_typing)
-            typing_thread.start()
+        if self.is_typing:
+            return
+        document = self.large_document
+        text = None
+        if document is None:
+            # Prefer reading directly from the Text widget to preserve indentation
+            try:
+                text = self.input_text.get('1.0', 'end-1c')
+            except Exception:
+                text = self.text_to_type.get()
+        live = LiveSettings(self.get_settings())
+        self.is_typing = True
+        self.progress_channel = ProgressChannel()
+        self.progress_channel.trace = RunTrace() if self.timing_report.get() else None
+        self.run_control = RunControl()
+        self.live_settings = live
+        self._checkpoint_at = time.monotonic()
+        self.simulate_button.config(text="Typing...", state=tk.DISABLED)
+        self.pause_button.config(text="Pause", state=tk.NORMAL)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.status_label.config(text="Status: Preparing the run...")
+        self.progress['value'] = 0
+        # a book is read and fingerprinted on the typing thread, not here
+        typing_thread = threading.Thread(target=self._prepare_and_type,
+                                         args=(document, text, live, self.output_backend.get(),
+                                               self.progress_channel.trace), daemon=True)
+        typing_thread.start()
+        self.root.after(1000 // PROGRESS_FPS, self._pump_progress)
+
+    def _prepare_and_type(self, document, text, live, backend_name, trace):
+        """Runs on the typing thread: read the text, offer to resume an earlier run, then type it."""
+        channel = self.progress_channel
+        try:
+            if document is not None:
+                text = document.read_all()
+            # decided once here: a large document may have fewer characters than its size in bytes
+            even_eta = document is not None or len(text) >= LARGE_TEXT_CHARS
+            channel.post('length', len(text))
+            resume = load_checkpoint(self.checkpoint_path, run_fingerprint(text))
+            if resume is not None and not (0 < resume.get('typed', 0) < len(text) and self._ask_resume(resume, len(text))):
+                resume = None
+        except Exception as e:
+            channel.post('status', f"Status: Could not read the text: {e}")
+            channel.post('done')
+            return
+        channel.typed = resume['typed'] if resume else 0
+        channel.post('status', f"Switch to your target application NOW ({GRACE_SECONDS} seconds)...")
+        self.simulate_typing(text, live, backend_name, resume, trace, even_eta)
+
+    def _ask_resume(self, resume, length) -> bool:
+        """Ask, through the Tk thread, whether to resume the checkpointed run; waits for the answer."""
+        answer = {}
+        ready = threading.Event()
+        self.progress_channel.post('ask_resume', (resume['typed'], length, answer, ready))
+        ready.wait()
+        return answer.get('yes', False)
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,231 @@
+"""Run many typing sessions at once, each on its own X display.
+
+For load-testing input-heavy applications: every session is a separate process
+(so each has its own pyautogui/Xlib connection, settings, random seed and
+timeline) bound to its own display, typically a local Xvfb server:
+
+    python sessions.py essay.txt --sessions 8 --xvfb --backend xtest
+    python sessions.py a.txt b.txt --sessions 4 --display-base 20 --preset deep
+    python sessions.py --jobs jobs.json --output sessions.json
+
+A jobs file is a JSON list of sessions; each entry needs an "input" file and may
+set "display", "backend", "preset", "wpm", "layout" and "seed" (anything missing
+comes from the command line). Progress of all sessions is printed on stderr once
+a second and a JSON report with per-session and aggregate throughput is written
+at the end.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import core
+from backends import OUTPUT_BACKENDS, get_backend
+from cli import resolve_settings
+from layouts import LAYOUTS
+from storage import load_config
+
+
+# How often a session reports its progress to the runner
+PROGRESS_SECONDS = 1.0
+# How long to wait for an Xvfb server to accept connections
+XVFB_START_TIMEOUT = 10.0
+
+
+class XvfbDisplay:
+    """A private Xvfb server on display `:number`, stopped by close()."""
+
+    def __init__(self, number: int, screen: str = '1280x1024x24'):
+        if shutil.which('Xvfb') is None:
+            raise RuntimeError("Xvfb is not installed (e.g. apt install xvfb).")
+        self.name = f":{number}"
+        self.process = subprocess.Popen(['Xvfb', self.name, '-screen', '0', screen, '-nolisten', 'tcp'],
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        socket = f"/tmp/.X11-unix/X{number}"
+        deadline = time.monotonic() + XVFB_START_TIMEOUT
+        while not os.path.exists(socket):
+            if self.process.poll() is not None or time.monotonic() > deadline:
+                self.close()
+                raise RuntimeError(f"Xvfb could not start on display {self.name}.")
+            time.sleep(0.05)
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+def run_session(job: dict, progress=None) -> dict:
+    """Type one job in this process and return its result; runs in a pool worker.
+
+    `progress` is a queue that receives (session, characters typed) about every
+    PROGRESS_SECONDS and once at the end.
+    """
+    if job.get('display'):
+        # both pyautogui and python-xlib connect to $DISPLAY; this process only has one
+        os.environ['DISPLAY'] = job['display']
+    session = job['session']
+    result = {'session': session, 'display': job.get('display'), 'input': job['input'], 'seed': job['seed'],
+              'backend': job['backend'], 'chars': 0}
+    last = [0.0]
+
+    def on_char(typed):
+        now = time.monotonic()
+        if now - last[0] >= PROGRESS_SECONDS:
+            last[0] = now
+            progress.put((session, typed))
+
+    backend = None
+    start = time.perf_counter()
+    try:
+        with open(job['input'], 'r', encoding=job.get('encoding', 'utf-8')) as f:
+            text = f.read()
+        backend = get_backend(job['backend'])
+        scheduler = core.DeadlineScheduler()
+        typed = core.type_text(text, core.LiveSettings(job['settings']), backend, rng=core.PlanRandom(job['seed']),
+                               on_char=on_char if progress is not None else None, scheduler=scheduler)
+        report = scheduler.report()
+        result.update(chars=typed, drift_seconds=report['drift_seconds'],
+                      max_late_seconds=report['max_late_seconds'])
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    finally:
+        if backend is not None:
+            backend.close()
+    seconds = time.perf_counter() - start
+    result['seconds'] = seconds
+    result['chars_per_second'] = result['chars'] / seconds if seconds else None
+    result['wpm'] = result['chars'] / 5 / (seconds / 60) if seconds else None
+    if progress is not None:
+        progress.put((session, result['chars']))
+    return result
+
+
+def aggregate(results, wall_seconds: float) -> dict:
+    """Totals over all sessions: characters, aggregate throughput and the worst timing drift."""
+    ok = [r for r in results if 'error' not in r]
+    chars = sum(r['chars'] for r in results)
+    return {
+        'sessions': len(results),
+        'failed': len(results) - len(ok),
+        'chars': chars,
+        'wall_seconds': wall_seconds,
+        'chars_per_second': chars / wall_seconds if wall_seconds else None,
+        'wpm': chars / 5 / (wall_seconds / 60) if wall_seconds else None,
+        'mean_session_wpm': sum(r['wpm'] or 0 for r in ok) / len(ok) if ok else None,
+        'max_drift_seconds': max((r['drift_seconds'] for r in ok), default=None),
+    }
+
+
+def build_jobs(args, config: dict) -> list:
+    """Expand the command line (or --jobs file) into one job dict per session."""
+    if args.jobs:
+        with open(args.jobs, 'r', encoding='utf-8') as f:
+            specs = json.load(f)
+    else:
+        if not args.inputs:
+            raise SystemExit("sessions.py: give input files or --jobs")
+        specs = [{'input': args.inputs[i % len(args.inputs)]} for i in range(args.sessions)]
+    base_seed = args.seed if args.seed is not None else int(time.time())
+    jobs = []
+    for i, spec in enumerate(specs):
+        jobs.append({
+            'session': i,
+            'input': spec['input'],
+            'display': spec.get('display', f":{args.display_base + i}" if args.display_base is not None else None),
+            'backend': spec.get('backend', args.backend or config.get('output_backend', 'pyautogui')),
+            'seed': spec.get('seed', base_seed + i),
+            'encoding': args.encoding,
+            'settings': resolve_settings(config, spec.get('preset', args.preset), spec.get('wpm', args.wpm),
+                                         spec.get('layout', args.layout)),
+        })
+    return jobs
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run several typing sessions in parallel, one per X display.")
+    parser.add_argument('inputs', nargs='*', help="text files; sessions cycle through them")
+    parser.add_argument('--jobs', help="JSON list of session specs instead of input files")
+    parser.add_argument('--sessions', type=int, default=1, help="number of sessions when using input files (default: %(default)s)")
+    parser.add_argument('--workers', type=int, help="processes in the pool (default: one per session)")
+    parser.add_argument('--display-base', type=int, help="session i uses display :BASE+i (default: inherit $DISPLAY)")
+    parser.add_argument('--xvfb', action='store_true', help="start a private Xvfb server for every session's display")
+    parser.add_argument('--config', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json'),
+                        help="settings file with config.json keys (default: %(default)s)")
+    parser.add_argument('--preset', choices=sorted(core.PRESETS), help="apply a preset on top of the config")
+    parser.add_argument('--wpm', type=float, help="override typing_speed_wpm")
+    parser.add_argument('--layout', choices=list(LAYOUTS), help="keyboard layout for typos")
+    parser.add_argument('--backend', choices=list(OUTPUT_BACKENDS), help="output backend (default: config's output_backend or pyautogui)")
+    parser.add_argument('--seed', type=int, help="seed of session 0; session i uses SEED+i (default: current time)")
+    parser.add_argument('--encoding', default='utf-8', help="encoding of the input files (default: %(default)s)")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    parser.add_argument('-q', '--quiet', action='store_true', help="no progress output on stderr")
+    return parser
+
+
+def main_cli(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.xvfb and args.display_base is None:
+        args.display_base = 100
+    jobs = build_jobs(args, load_config(args.config))
+
+    displays = []
+    results = []
+    try:
+        if args.xvfb:
+            for job in jobs:
+                try:
+                    displays.append(XvfbDisplay(int(job['display'].lstrip(':'))))
+                except RuntimeError as e:
+                    print(f"sessions.py: {e}", file=sys.stderr)
+                    return 2
+        # spawn, so every worker imports pyautogui/Xlib fresh against its own $DISPLAY
+        context = multiprocessing.get_context('spawn')
+        with context.Manager() as manager, \
+                ProcessPoolExecutor(max_workers=args.workers or len(jobs), mp_context=context) as pool:
+            progress = manager.Queue()
+            typed = {job['session']: 0 for job in jobs}
+            start = time.perf_counter()
+            futures = [pool.submit(run_session, job, progress) for job in jobs]
+            while True:
+                finished = sum(f.done() for f in futures)
+                while not progress.empty():
+                    session, count = progress.get()
+                    typed[session] = count
+                if not args.quiet:
+                    elapsed = time.perf_counter() - start
+                    total = sum(typed.values())
+                    print(f"[{elapsed:7.1f}s] {len(jobs) - finished} running, {total:,} chars, "
+                          f"{total / elapsed if elapsed else 0:,.0f} chars/s", file=sys.stderr)
+                if finished == len(futures):
+                    break
+                time.sleep(PROGRESS_SECONDS)
+            results = [f.result() for f in futures]
+            wall = time.perf_counter() - start
+    finally:
+        for display in displays:
+            display.close()
+
+    for r in results:
+        if 'error' in r and not args.quiet:
+            print(f"session {r['session']} ({r['display']}): {r['error']}", file=sys.stderr)
+    report = {'aggregate': aggregate(results, wall), 'sessions': results}
+    out = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(out)
+    else:
+        print(out)
+    return 1 if report['aggregate']['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
@@ -0,0 +1,231 @@
+"""Config and document files.
+
+config.json only holds settings; the text to type lives in its own file, referenced
+by the 'text_file' key (relative to the config's folder). Older configs that carry
+the text inline under 'text_to_type' are still read.
+
+Saves are atomic (write a temp file, then rename over the target) and can be handed
+to a BackgroundWriter so the Tk thread never waits on the disk.
+"""
+import atexit
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from array import array
+
+# Document file used when a config does not name one
+DEFAULT_TEXT_FILE = 'document.txt'
+
+# Where an interrupted run's progress is kept, next to config.json
+CHECKPOINT_FILE = 'checkpoint.json'
+
+# Folder next to config.json holding cached document analyses (see core.AnalysisCache)
+ANALYSIS_CACHE_DIR = 'analysis_cache'
+
+# Size of a PagedDocument page: at most this many lines, or bytes for very long lines
+PAGE_LINES = 500
+PAGE_BYTES = 256 * 1024
+# Bytes read at a time while indexing a PagedDocument
+_SCAN_CHUNK = 1 << 20
+
+
+def load_config(path: str) -> dict:
+    """Read a config.json-style file; returns {} if it is missing or unreadable."""
+    try:
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    except Exception:
+        pass
+    return {}
+
+
+def text_file_path(config: dict, config_path: str) -> str:
+    """Absolute path of the document a config refers to."""
+    name = config.get('text_file', DEFAULT_TEXT_FILE)
+    return os.path.join(os.path.dirname(os.path.abspath(config_path)), name)
+
+
+def open_document(config: dict, config_path: str, encoding: str = 'utf-8'):
+    """Open the config's document for reading as a text stream, or return None.
+
+    Inline 'text_to_type' (older configs) wins over 'text_file' so nothing is lost
+    before the config is saved again.
+    """
+    if 'text_to_type' in config:
+        return io.StringIO(config['text_to_type'])
+    path = text_file_path(config, config_path)
+    if not os.path.exists(path):
+        return None
+    return open(path, 'r', encoding=encoding)
+
+
+def read_document(config: dict, config_path: str, default: str = '') -> str:
+    """Return the text of the config's document (see open_document)."""
+    stream = open_document(config, config_path)
+    if stream is None:
+        return default
+    with stream:
+        return stream.read()
+
+
+class PagedDocument:
+    """Read-only view of a text file, read one page at a time.
+
+    Only the byte offset of every page is kept in memory, so a book-length file costs
+    a few kilobytes until read_all() is called. Pages end after `page_lines` lines, or
+    earlier, at a character boundary, when a page would exceed `page_bytes`.
+    """
+
+    def __init__(self, path: str, encoding: str = 'utf-8', page_lines: int = PAGE_LINES,
+                 page_bytes: int = PAGE_BYTES):
+        self.path = path
+        self.encoding = encoding
+        with open(path, 'rb') as f:
+            self.offsets = self._page_offsets(f, page_lines, page_bytes)
+        self.size = self.offsets[-1]
+
+    @staticmethod
+    def _page_offsets(f, page_lines: int, page_bytes: int):
+        """Byte offsets of every page start, followed by the file size."""
+        offsets = array('q', [0])
+        start = pos = lines = 0  # page start, offset of the current chunk, lines in the page
+        previous = None  # last byte of the previous chunk
+        while True:
+            chunk = f.read(_SCAN_CHUNK)
+            if not chunk:
+                break
+            i = 0
+            while True:
+                limit = start + page_bytes - pos  # where the page reaches page_bytes, in the chunk
+                nl = chunk.find(b'\n', i, max(i, min(len(chunk), limit)))
+                if nl >= 0:
+                    i = nl + 1
+                    lines += 1
+                    if lines < page_lines:
+                        continue
+                elif limit < len(chunk):
+                    # cut the over-long page, but not inside a UTF-8 sequence
+                    i = max(i, limit)
+                    while i < len(chunk) and chunk[i] & 0xC0 == 0x80:
+                        i += 1
+                    if i == len(chunk):
+                        # the character continues in the next chunk; cut there
+                        break
+                    if chunk[i] == 0x0A and (chunk[i - 1] if i else previous) == 0x0D:
+                        i += 1
+                else:
+                    break
+                start = pos + i
+                offsets.append(start)
+                lines = 0
+            pos += len(chunk)
+            previous = chunk[-1]
+        if len(offsets) > 1 and offsets[-1] == pos:
+            offsets.pop()
+        offsets.append(pos)
+        return offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def page(self, n: int) -> str:
+        """Text of page `n` (0-based), with line endings normalized like read_all()."""
+        start, end = self.offsets[n], self.offsets[n + 1]
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+        return data.decode(self.encoding, 'replace').replace('\r\n', '\n').replace('\r', '\n')
+
+    def read_all(self) -> str:
+        """The whole text, as read_document would return it."""
+        with open(self.path, 'r', encoding=self.encoding) as f:
+            return f.read()
+
+
+def atomic_write_text(path: str, text: str, encoding: str = 'utf-8'):
+    """Write `text` to `path` so readers see either the old or the new file, never a partial one."""
+    atomic_write_bytes(path, text.encode(encoding))
+
+
+def atomic_write_bytes(path: str, data: bytes):
+    """atomic_write_text for binary data."""
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=folder)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def run_fingerprint(text: str) -> str:
+    """Identify a run by its text; a checkpoint only applies to a run of the same text.
+
+    Settings are left out: compile_plan draws the same random numbers per character
+    whatever they are, so a run resumed with other settings (or with a slider moved
+    mid-run) continues the same random stream from the checkpoint.
+    """
+    return hashlib.sha1(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def load_checkpoint(path: str, fingerprint: str):
+    """Return the checkpoint saved at `path` if it belongs to run `fingerprint`, else None."""
+    checkpoint = load_config(path)
+    if checkpoint.get('fingerprint') != fingerprint:
+        return None
+    return checkpoint
+
+
+class BackgroundWriter:
+    """Writes files on a worker thread; only the latest content submitted per path is written.
+
+    Bursts of saves (e.g. dragging a slider) collapse into one write. Submitting None
+    deletes the file instead. Pending writes are flushed at interpreter exit.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._busy = False
+        self._thread = None
+        atexit.register(self.flush)
+
+    def submit(self, path: str, text: str):
+        with self._cond:
+            self._pending[path] = text
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='config-writer', daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._busy = False
+                    self._cond.notify_all()
+                    self._cond.wait()
+                self._busy = True
+                path, text = self._pending.popitem()
+            try:
+                if text is None:
+                    if os.path.exists(path):
+                        os.remove(path)
+                else:
+                    atomic_write_text(path, text)
+            except OSError:
+                pass
+
+    def flush(self, timeout: float = 5.0):
+        """Block until every submitted write has reached the disk (or `timeout` passes)."""
+        with self._cond:
+            self._cond.wait_for(lambda: not self._pending and not self._busy, timeout)